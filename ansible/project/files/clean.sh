@@ -24,6 +24,12 @@ clean_iptables () {
     clean_services "iptables-check.timer"
 }
 
+clean_nftables () {
+    nft -v > /dev/null 2>&1 || return 0
+    $SUDO nft delete table inet aurora > /dev/null 2>&1
+    clean_services "aurora-nftables.service"
+}
+
 clean_aurora () {
     $SUDO systemctl stop system-aurora.slice
     clean_services "aurora@*.service"
@@ -39,5 +45,6 @@ clean_scripts () {
 }
 
 clean_iptables
+clean_nftables
 clean_aurora
 clean_scripts
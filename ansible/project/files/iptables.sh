@@ -7,6 +7,18 @@ IP_VERSION="4"
 LOCAL_PORT=65536
 REMOTE_IP=""
 REMOTE_PORT=65536
+IPSET_RESTORE_FILE="/usr/local/etc/aurora/ipset.rules"
+BACKEND="iptables"
+NFT_RESTORE_FILE="/usr/local/etc/aurora/nftables.rules"
+NFT_STATE_DIR="/usr/local/etc/aurora/nft"
+TMP_DIR=$(mktemp -d)
+trap "rm -rf $TMP_DIR" EXIT
+NFT_DELETE_BATCH=$TMP_DIR/nft-delete
+NFT_ADD_BATCH=$TMP_DIR/nft-add
+touch $NFT_DELETE_BATCH $NFT_ADD_BATCH
+# Ports whose nft state is dropped / "<port> <state>" saved on nft_commit
+NFT_DROP_PORTS=""
+NFT_STATES=()
 
 check_system () {
     source '/etc/os-release'
@@ -44,6 +56,243 @@ install_ip6tables () {
     $INSTALL ip6tables || ($UPDATE && $INSTALL ip6tables) || (echo "Failed to install ip6tables" && exit 1)
 }
 
+install_ipset () {
+    ipset -v > /dev/null 2>&1 && return 0
+    $INSTALL ipset || ($UPDATE && $INSTALL ipset) || (echo "Failed to install ipset" && exit 1)
+}
+
+ensure_rule () {
+    # ensure_rule <iptables|ip6tables> <-A|-I> <chain> <rule...>
+    IPT=$1; ACTION=$2; shift 2
+    $SUDO $IPT -C "$@" > /dev/null 2>&1 || $SUDO $IPT $ACTION "$@"
+}
+
+# Port counters live in ipsets: one O(1) set lookup per packet instead of
+# walking one comment rule per port, and one line per counter when listing.
+# aurora-up/down count local ports (apps), aurora-fwd-up/down{4,6} count
+# forwards by remote ip,proto:port with the local port as comment.
+ensure_counter_sets () {
+    install_ipset
+    $SUDO ipset create -exist aurora-up bitmap:port range 0-65535 counters
+    $SUDO ipset create -exist aurora-down bitmap:port range 0-65535 counters
+    $SUDO ipset create -exist aurora-fwd-up4 hash:ip,port family inet counters comment
+    $SUDO ipset create -exist aurora-fwd-down4 hash:ip,port family inet counters comment
+    $SUDO ipset create -exist aurora-fwd-up6 hash:ip,port family inet6 counters comment
+    $SUDO ipset create -exist aurora-fwd-down6 hash:ip,port family inet6 counters comment
+    for IPT in iptables ip6tables; do
+        ensure_rule $IPT -A INPUT -m set --match-set aurora-up dst -j ACCEPT
+        ensure_rule $IPT -A OUTPUT -m set --match-set aurora-down src -j ACCEPT
+    done
+    ensure_rule iptables -I FORWARD -m set --match-set aurora-fwd-up4 dst,dst -j ACCEPT
+    ensure_rule iptables -I FORWARD -m set --match-set aurora-fwd-down4 src,src -j ACCEPT
+    ensure_rule ip6tables -I FORWARD -m set --match-set aurora-fwd-up6 dst,dst -j ACCEPT
+    ensure_rule ip6tables -I FORWARD -m set --match-set aurora-fwd-down6 src,src -j ACCEPT
+}
+
+add_forward_counters () {
+    # add_forward_counters <tcp|udp>
+    $SUDO ipset add -exist aurora-fwd-up$IP_VERSION $REMOTE_IP,$1:$REMOTE_PORT comment "$LOCAL_PORT"
+    $SUDO ipset add -exist aurora-fwd-down$IP_VERSION $REMOTE_IP,$1:$REMOTE_PORT comment "$LOCAL_PORT"
+}
+
+list_counters () {
+    # add <set> <entry> packets <n> bytes <n> [comment "<port>"]
+    $SUDO ipset save 2>/dev/null | grep -E "^add aurora-(fwd-)?(up|down)[46]? "
+}
+
+list_port_counters () {
+    list_counters | grep -E "^add aurora-(up|down) $LOCAL_PORT |comment \"$LOCAL_PORT\"$"
+}
+
+reset_counters () {
+    list_port_counters | while read -r _ SET ENTRY _; do
+        $SUDO ipset del -exist $SET $ENTRY
+        if [[ $SET == aurora-fwd-* ]]; then
+            $SUDO ipset add -exist $SET $ENTRY comment "$LOCAL_PORT"
+        else
+            $SUDO ipset add -exist $SET $ENTRY
+        fi
+    done
+}
+
+delete_counters () {
+    list_port_counters | while read -r _ SET ENTRY _; do
+        $SUDO ipset del -exist $SET $ENTRY
+    done
+}
+
+# nftables backend: one "inet aurora" table, ports are dispatched by verdict
+# maps keyed by (local) port to per-port chains holding named counters
+# up_<port>/down_<port>, forwards are matched on their conntrack original
+# tuple. Every change of a port is one atomic `nft -f` transaction.
+install_nft () {
+    nft -v > /dev/null 2>&1 && return 0
+    $INSTALL nftables || ($UPDATE && $INSTALL nftables) || (echo "Failed to install nftables" && exit 1)
+}
+
+has_nft_table () {
+    $SUDO nft list table inet aurora > /dev/null 2>&1
+}
+
+ensure_nft_table () {
+    has_nft_table && return 0
+    $SUDO nft -f - <<EOF
+table inet aurora {
+    map up { type inet_service : verdict; }
+    map down { type inet_service : verdict; }
+    map fwd_up { type inet_proto . inet_service : verdict; }
+    map fwd_down { type inet_proto . inet_service : verdict; }
+    map dnat4 { type inet_proto . inet_service : ipv4_addr . inet_service; }
+    map dnat6 { type inet_proto . inet_service : ipv6_addr . inet_service; }
+    set fwd_ports { type inet_proto . inet_service; }
+    chain prerouting {
+        type nat hook prerouting priority dstnat; policy accept;
+        dnat ip to meta l4proto . th dport map @dnat4
+        dnat ip6 to meta l4proto . th dport map @dnat6
+    }
+    chain postrouting {
+        type nat hook postrouting priority srcnat; policy accept;
+        ct status dnat ct original protocol . ct original proto-dst @fwd_ports masquerade
+    }
+    chain input {
+        type filter hook input priority filter; policy accept;
+        meta l4proto { tcp, udp } th dport vmap @up
+    }
+    chain output {
+        type filter hook output priority filter; policy accept;
+        meta l4proto { tcp, udp } th sport vmap @down
+    }
+    chain forward {
+        type filter hook forward priority filter; policy accept;
+        ct status dnat ct direction original ct original protocol . ct original proto-dst vmap @fwd_up
+        ct status dnat ct direction reply ct original protocol . ct original proto-dst vmap @fwd_down
+    }
+}
+EOF
+}
+
+nft_element () {
+    # nft_element <add|delete> <map> <key> [value]
+    if [[ $1 == "add" ]]; then
+        echo "add element inet aurora $2 { $3${4:+ : $4} }"
+    else
+        echo "delete element inet aurora $2 { $3 }"
+    fi
+}
+
+nft_port_batch () {
+    # nft_port_batch <add|delete>, for LOCAL_PORT in NFT_MODE (monitor|forward)
+    if [[ $1 == "add" ]]; then
+        for DIRECTION in up down; do
+            echo "add counter inet aurora ${DIRECTION}_$LOCAL_PORT"
+            echo "add chain inet aurora ${DIRECTION}_$LOCAL_PORT"
+            echo "add rule inet aurora ${DIRECTION}_$LOCAL_PORT counter name \"${DIRECTION}_$LOCAL_PORT\""
+        done
+    fi
+    if [[ $NFT_MODE == "monitor" ]]; then
+        nft_element $1 up $LOCAL_PORT "jump up_$LOCAL_PORT"
+        nft_element $1 down $LOCAL_PORT "jump down_$LOCAL_PORT"
+    else
+        [[ $TYPE == "ALL" ]] && PROTOS="tcp udp" || PROTOS=${TYPE,,}
+        for PROTO in $PROTOS; do
+            nft_element $1 dnat$IP_VERSION "$PROTO . $LOCAL_PORT" "$REMOTE_IP . $REMOTE_PORT"
+            nft_element $1 fwd_ports "$PROTO . $LOCAL_PORT"
+            nft_element $1 fwd_up "$PROTO . $LOCAL_PORT" "jump up_$LOCAL_PORT"
+            nft_element $1 fwd_down "$PROTO . $LOCAL_PORT" "jump down_$LOCAL_PORT"
+        done
+    fi
+    if [[ $1 == "delete" ]]; then
+        for DIRECTION in up down; do
+            echo "flush chain inet aurora ${DIRECTION}_$LOCAL_PORT"
+            echo "delete chain inet aurora ${DIRECTION}_$LOCAL_PORT"
+            echo "delete counter inet aurora ${DIRECTION}_$LOCAL_PORT"
+        done
+    fi
+}
+
+nft_add () {
+    # nft_add <monitor|forward>, queued until nft_commit
+    ensure_nft_table
+    NFT_MODE=$1
+    nft_port_batch add >> $NFT_ADD_BATCH
+    NFT_STATES+=("$LOCAL_PORT NFT_MODE=$NFT_MODE TYPE=$TYPE IP_VERSION=$IP_VERSION REMOTE_IP=$REMOTE_IP REMOTE_PORT=$REMOTE_PORT")
+}
+
+nft_delete () {
+    # The elements of a port are only known from the state saved when added
+    [[ -f $NFT_STATE_DIR/$LOCAL_PORT ]] || return 0
+    NFT_DROP_PORTS="$NFT_DROP_PORTS $LOCAL_PORT"
+    has_nft_table || return 0
+    (source $NFT_STATE_DIR/$LOCAL_PORT && nft_port_batch delete) >> $NFT_DELETE_BATCH
+}
+
+nft_commit () {
+    [[ -n $NFT_DROP_PORTS || ${#NFT_STATES[@]} -gt 0 ]] || return 0
+    if [[ -s $NFT_DELETE_BATCH || -s $NFT_ADD_BATCH ]]; then
+        # Stale state (e.g. table flushed by hand) only fails the delete part
+        cat $NFT_DELETE_BATCH $NFT_ADD_BATCH | $SUDO nft -f - 2> /dev/null || \
+        $SUDO nft -f $NFT_ADD_BATCH || \
+        { echo "Failed to apply nftables rules"; exit 1; }
+    fi
+    for PORT in $NFT_DROP_PORTS; do
+        $SUDO rm -f $NFT_STATE_DIR/$PORT
+    done
+    $SUDO mkdir -p $NFT_STATE_DIR
+    for STATE in "${NFT_STATES[@]}"; do
+        echo "${STATE#* }" | $SUDO tee $NFT_STATE_DIR/${STATE%% *} > /dev/null
+    done
+    save_nftables
+}
+
+nft_list () {
+    has_nft_table || return 0
+    $SUDO nft -j list counter inet aurora up_$LOCAL_PORT 2> /dev/null
+    $SUDO nft -j list counter inet aurora down_$LOCAL_PORT 2> /dev/null
+}
+
+nft_list_all () {
+    has_nft_table || return 0
+    $SUDO nft -j list counters table inet aurora
+    save_nftables
+}
+
+nft_reset () {
+    has_nft_table || return 0
+    $SUDO nft reset counter inet aurora up_$LOCAL_PORT > /dev/null 2>&1
+    $SUDO nft reset counter inet aurora down_$LOCAL_PORT > /dev/null 2>&1
+}
+
+save_nftables () {
+    has_nft_table || return 0
+    $SUDO mkdir -p $(dirname $NFT_RESTORE_FILE)
+    $SUDO nft list table inet aurora | $SUDO tee $NFT_RESTORE_FILE > /dev/null
+}
+
+install_nft_service () {
+    NFT_PATH=$(which nft)
+    [[ -z $NFT_PATH ]] && return 0
+    $SUDO tee /etc/systemd/system/aurora-nftables.service > /dev/null <<EOF
+[Unit]
+Description=Restore nftables rules by Aurora Admin Panel
+After=nftables.service
+
+[Service]
+Type=oneshot
+RemainAfterExit=yes
+ExecStart=/bin/sh -c '[ -f $NFT_RESTORE_FILE ] && $NFT_PATH -f $NFT_RESTORE_FILE || true'
+
+[Install]
+WantedBy=multi-user.target
+EOF
+}
+
+check_nft_service () {
+    [[ $IS_SYSTEMD -ne 1 ]] && return 0
+    ! systemctl is-enabled --quiet aurora-nftables.service > /dev/null 2>&1 && install_nft_service && \
+    $SUDO systemctl daemon-reload && \
+    $SUDO systemctl enable aurora-nftables.service > /dev/null 2>&1
+}
+
 install_ip () {
     ip a > /dev/null && return 0
     if [[ $OS_FAMILY == "centos" ]]; then
@@ -175,6 +424,31 @@ WantedBy=timers.target
 EOF
 }
 
+install_ipset_service () {
+    IPSET_PATH=$(which ipset)
+    [[ -z $IPSET_PATH ]] && return 0
+    $SUDO tee /etc/systemd/system/ipset-restore.service > /dev/null <<EOF
+[Unit]
+Description=Restore ipset counters by Aurora Admin Panel
+Before=iptables-restore.service ip6tables-restore.service netfilter-persistent.service
+
+[Service]
+Type=oneshot
+RemainAfterExit=yes
+ExecStart=/bin/sh -c '[ -f $IPSET_RESTORE_FILE ] && $IPSET_PATH restore -exist < $IPSET_RESTORE_FILE || true'
+
+[Install]
+WantedBy=multi-user.target
+EOF
+}
+
+check_ipset_service () {
+    [[ $IS_SYSTEMD -ne 1 ]] && return 0
+    ! systemctl is-enabled --quiet ipset-restore.service > /dev/null 2>&1 && install_ipset_service && \
+    $SUDO systemctl daemon-reload && \
+    $SUDO systemctl enable ipset-restore.service > /dev/null 2>&1
+}
+
 check_ipt_service () {
     if [[ $IS_SYSTEMD -eq 1 ]]; then
         ! systemctl is-active --quiet iptables-restore.service > /dev/null 2>&1 && install_ipt_service && \
@@ -211,6 +485,10 @@ check_ipt_timer () {
 
 save_iptables () {
     check_ipt_restore_file
+    if ipset -v > /dev/null 2>&1; then
+        $SUDO mkdir -p $(dirname $IPSET_RESTORE_FILE)
+        $SUDO ipset save | grep -E "aurora-(fwd-)?(up|down)" | $SUDO tee $IPSET_RESTORE_FILE > /dev/null
+    fi
     if [[ $OS_FAMILY == "centos" || $OS_FAMILY == "debian" ]]; then
         [[ -f $IPT_RESTORE_FILE ]] && $SUDO iptables-save -c | $SUDO tee $IPT_RESTORE_FILE > /dev/null
         [[ -f $IPT6_RESTORE_FILE ]] && $SUDO ip6tables-save -c | $SUDO tee $IPT6_RESTORE_FILE > /dev/null
@@ -272,8 +550,7 @@ forward4 () {
         done
         $SUDO iptables -t nat -A PREROUTING -p tcp --dport $LOCAL_PORT -j DNAT --to-destination $REMOTE_IP:$REMOTE_PORT  -m comment --comment "FORWARD $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT"
         # for ipt port traffic monitor
-        $SUDO iptables -I FORWARD -p tcp -d $REMOTE_IP --dport $REMOTE_PORT -j ACCEPT -m comment --comment "UPLOAD $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT"
-        $SUDO iptables -I FORWARD -p tcp -s $REMOTE_IP -j ACCEPT -m comment --comment "DOWNLOAD $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT"
+        add_forward_counters tcp
     fi
     if [[ $TYPE == "ALL" || $TYPE == "UDP" ]]
     then
@@ -282,8 +559,7 @@ forward4 () {
         done
         $SUDO iptables -t nat -A PREROUTING -p udp --dport $LOCAL_PORT -j DNAT --to-destination $REMOTE_IP:$REMOTE_PORT  -m comment --comment "FORWARD $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT"
         # for ipt port traffic monitor
-        $SUDO iptables -I FORWARD -p udp -d $REMOTE_IP --dport $REMOTE_PORT -j ACCEPT -m comment --comment "UPLOAD-UDP $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT"
-        $SUDO iptables -I FORWARD -p udp -s $REMOTE_IP -j ACCEPT -m comment --comment "DOWNLOAD-UDP $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT"
+        add_forward_counters udp
     fi
 }
 
@@ -293,21 +569,21 @@ forward6 () {
         $SUDO ip6tables -t nat -A POSTROUTING -d $REMOTE_IP -p tcp --dport $REMOTE_PORT -j MASQUERADE -m comment --comment "BACKWARD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
         $SUDO ip6tables -t nat -A PREROUTING -p tcp --dport $LOCAL_PORT -j DNAT --to-destination "[$REMOTE_IP]":$REMOTE_PORT  -m comment --comment "FORWARD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
         # for ipt port traffic monitor
-        $SUDO ip6tables -I FORWARD -p tcp -d $REMOTE_IP --dport $REMOTE_PORT -j ACCEPT -m comment --comment "UPLOAD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
-        $SUDO ip6tables -I FORWARD -p tcp -s $REMOTE_IP -j ACCEPT -m comment --comment "DOWNLOAD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
+        add_forward_counters tcp
     fi
     if [[ $TYPE == "ALL" || $TYPE == "UDP" ]]
     then
         $SUDO ip6tables -t nat -A POSTROUTING -d $REMOTE_IP -p udp --dport $REMOTE_PORT -j MASQUERADE -m comment --comment "BACKWARD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
         $SUDO ip6tables -t nat -A PREROUTING -p udp --dport $LOCAL_PORT -j DNAT --to-destination "[$REMOTE_IP]":$REMOTE_PORT  -m comment --comment "FORWARD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
         # for ipt port traffic monitor
-        $SUDO ip6tables -I FORWARD -p udp -d $REMOTE_IP --dport $REMOTE_PORT -j ACCEPT -m comment --comment "UPLOAD-UDP $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
-        $SUDO ip6tables -I FORWARD -p udp -s $REMOTE_IP -j ACCEPT -m comment --comment "DOWNLOAD-UDP $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT"
+        add_forward_counters udp
     fi
 }
 
 forward () {
     set_forward
+    [[ $BACKEND == "nftables" ]] && nft_add forward && return 0
+    ensure_counter_sets
     if [[ $IP_VERSION == "4" ]]; then
         forward4
     elif [[ $IP_VERSION == "6" ]]; then
@@ -316,22 +592,89 @@ forward () {
     save_iptables
 }
 
-monitor () {
+restore_delete () {
+    # Queue removal of every rule, counter and set entry of LOCAL_PORT
+    $SUDO iptables -S | grep -- " $LOCAL_PORT->" | sed 's/^-A /-D /' >> $TMP_DIR/filter4
+    $SUDO iptables -t nat -S | grep -- " $LOCAL_PORT->" | sed 's/^-A /-D /' >> $TMP_DIR/nat4
+    $SUDO ip6tables -S | grep -- " $LOCAL_PORT->" | sed 's/^-A /-D /' >> $TMP_DIR/filter6
+    $SUDO ip6tables -t nat -S | grep -- " $LOCAL_PORT->" | sed 's/^-A /-D /' >> $TMP_DIR/nat6
+    list_port_counters | while read -r _ SET ENTRY _; do
+        echo "del $SET $ENTRY"
+    done >> $TMP_DIR/ipset
+}
+
+restore_forward () {
+    # Same rules as forward4/forward6, queued for iptables-restore
+    [[ $TYPE == "ALL" ]] && PROTOS="tcp udp" || PROTOS=${TYPE,,}
+    for PROTO in $PROTOS; do
+        if [[ $IP_VERSION == "4" ]]; then
+            for SNATIP in $INET; do
+                echo "-A POSTROUTING -d $REMOTE_IP -p $PROTO --dport $REMOTE_PORT -j SNAT --to-source $SNATIP -m comment --comment \"BACKWARD $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT\""
+            done >> $TMP_DIR/nat4
+            echo "-A PREROUTING -p $PROTO --dport $LOCAL_PORT -j DNAT --to-destination $REMOTE_IP:$REMOTE_PORT -m comment --comment \"FORWARD $LOCAL_PORT->$REMOTE_IP:$REMOTE_PORT\"" >> $TMP_DIR/nat4
+        else
+            echo "-A POSTROUTING -d $REMOTE_IP -p $PROTO --dport $REMOTE_PORT -j MASQUERADE -m comment --comment \"BACKWARD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT\"" >> $TMP_DIR/nat6
+            echo "-A PREROUTING -p $PROTO --dport $LOCAL_PORT -j DNAT --to-destination [$REMOTE_IP]:$REMOTE_PORT -m comment --comment \"FORWARD $LOCAL_PORT->[$REMOTE_IP]:$REMOTE_PORT\"" >> $TMP_DIR/nat6
+        fi
+        echo "add aurora-fwd-up$IP_VERSION $REMOTE_IP,$PROTO:$REMOTE_PORT comment \"$LOCAL_PORT\"" >> $TMP_DIR/ipset
+        echo "add aurora-fwd-down$IP_VERSION $REMOTE_IP,$PROTO:$REMOTE_PORT comment \"$LOCAL_PORT\"" >> $TMP_DIR/ipset
+    done
+}
+
+restore_apply () {
+    touch $TMP_DIR/filter4 $TMP_DIR/nat4 $TMP_DIR/filter6 $TMP_DIR/nat6 $TMP_DIR/ipset
+    (echo "*filter"; cat $TMP_DIR/filter4; echo "COMMIT"; echo "*nat"; cat $TMP_DIR/nat4; echo "COMMIT") | \
+    $SUDO iptables-restore --noflush || { echo "Failed to restore iptables rules"; exit 1; }
+    (echo "*filter"; cat $TMP_DIR/filter6; echo "COMMIT"; echo "*nat"; cat $TMP_DIR/nat6; echo "COMMIT") | \
+    $SUDO ip6tables-restore --noflush || { echo "Failed to restore ip6tables rules"; exit 1; }
+    $SUDO ipset restore -exist < $TMP_DIR/ipset || { echo "Failed to restore ipset counters"; exit 1; }
+}
+
+restore () {
+    # restore <spec>..., a spec is "<port>" to delete, "<port>,LIST" to list
+    # or "<port>,<ALL|TCP|UDP>,<remote ip>,<remote port>" to forward. Counters
+    # of every port are listed before all changes are applied in one go.
     set_forward
-    if [ $TYPE == "ALL" ] || [ $TYPE == "TCP" ]
-    then
-        $SUDO iptables -A INPUT -p tcp --dport $LOCAL_PORT -j ACCEPT -m comment --comment "UPLOAD $LOCAL_PORT->$REMOTE_IP"
-        $SUDO iptables -A OUTPUT -p tcp  --sport $LOCAL_PORT -j ACCEPT -m comment --comment "DOWNLOAD $LOCAL_PORT->$REMOTE_IP"
-        $SUDO ip6tables -A INPUT -p tcp --dport $LOCAL_PORT -j ACCEPT -m comment --comment "UPLOAD $LOCAL_PORT->$REMOTE_IP"
-        $SUDO ip6tables -A OUTPUT -p tcp  --sport $LOCAL_PORT -j ACCEPT -m comment --comment "DOWNLOAD $LOCAL_PORT->$REMOTE_IP"
-    fi
-    if [ $TYPE == "ALL" ] || [ $TYPE == "UDP" ]
-    then
-        $SUDO iptables -A INPUT -p udp --dport $LOCAL_PORT -j ACCEPT -m comment --comment "UPLOAD-UDP $LOCAL_PORT->$REMOTE_IP"
-        $SUDO iptables -A OUTPUT -p udp --sport $LOCAL_PORT -j ACCEPT -m comment --comment "DOWNLOAD-UDP $LOCAL_PORT->$REMOTE_IP"
-        $SUDO ip6tables -A INPUT -p udp --dport $LOCAL_PORT -j ACCEPT -m comment --comment "UPLOAD-UDP $LOCAL_PORT->$REMOTE_IP"
-        $SUDO ip6tables -A OUTPUT -p udp --sport $LOCAL_PORT -j ACCEPT -m comment --comment "DOWNLOAD-UDP $LOCAL_PORT->$REMOTE_IP"
+    if [[ $BACKEND == "nftables" ]]; then
+        ensure_nft_table
+    else
+        ensure_counter_sets
+        get_ips
     fi
+    for SPEC in "$@"; do
+        IFS=, read -r LOCAL_PORT TYPE REMOTE_IP REMOTE_PORT <<< "$SPEC"
+        [[ ! $LOCAL_PORT =~ ^[0-9]+$ || $LOCAL_PORT -ge 65536 ]] && echo "Unknow local port in spec $SPEC" && exit 1
+        list
+        [[ $TYPE == "LIST" ]] && continue
+        if [[ -n $TYPE ]]; then
+            [[ ! $TYPE =~ ^(ALL|TCP|UDP)$ ]] && echo "Unsupported forward type in spec $SPEC" && exit 1
+            [[ -z $REMOTE_IP || ! $REMOTE_PORT =~ ^[0-9]+$ ]] && echo "Unknow remote in spec $SPEC" && exit 1
+            delete_service
+        fi
+        if [[ $BACKEND == "nftables" ]]; then
+            # Legacy iptables rules of the port are removed one by one
+            [[ -n "$($SUDO iptables -S 2> /dev/null | grep -- " $LOCAL_PORT->")" ]] && delete
+            nft_delete
+            [[ -n $TYPE ]] && nft_add forward
+        else
+            restore_delete
+            if [[ -n $TYPE ]]; then
+                [[ $IP_VERSION == "4" && -z $INET ]] && echo "No valid interface ipv4 addresses found" && exit 1
+                restore_forward
+            fi
+        fi
+    done
+    [[ $BACKEND == "nftables" ]] && return 0
+    restore_apply
+    save_iptables
+}
+
+monitor () {
+    set_forward
+    [[ $BACKEND == "nftables" ]] && nft_add monitor && return 0
+    ensure_counter_sets
+    $SUDO ipset add -exist aurora-up $LOCAL_PORT
+    $SUDO ipset add -exist aurora-down $LOCAL_PORT
     save_iptables
 }
 
@@ -341,6 +684,8 @@ list () {
     $SUDO iptables -t nat -nxvL | grep $COMMENT
     $SUDO ip6tables -nxvL | grep $COMMENT
     $SUDO ip6tables -t nat -nxvL | grep $COMMENT
+    list_port_counters
+    nft_list
 }
 
 list_all () {
@@ -350,14 +695,16 @@ list_all () {
     $SUDO ip6tables -nxvL INPUT | grep '\/\*.*\*\/$'
     $SUDO ip6tables -nxvL FORWARD | grep '\/\*.*\*\/$'
     $SUDO ip6tables -nxvL OUTPUT | grep '\/\*.*\*\/$'
+    list_counters
     save_iptables
+    nft_list_all
 }
 
 list_all_services () {
     [[ $IS_SYSTEMD -ne 1 ]] && return 0
     AURORA_SERVICES=$(find /etc/systemd/system/multi-user.target.wants -maxdepth 1 -type l -regex ".*/aurora@[0-9]+\.service" -exec basename {} \;)
     for AURORA_SERVICE in $AURORA_SERVICES; do
-        systemctl is-active $AURORA_SERVICE > /dev/null 2>&1 && echo -e "$AURORA_SERVICE $(grep -Eo "^ExecStart=.*" /etc/systemd/system/multi-user.target.wants/$AURORA_SERVICE)"
+        systemctl is-active $AURORA_SERVICE > /dev/null 2>&1 && echo -e "$AURORA_SERVICE $(grep -Eo "^ExecStart=.*" /etc/systemd/system/multi-user.target.wants/$AURORA_SERVICE) $(grep -Eo "^# aurora-digest=\w+" /etc/systemd/system/multi-user.target.wants/$AURORA_SERVICE | cut -c 3-)"
     done
 }
 
@@ -366,6 +713,8 @@ reset () {
    $SUDO iptables -L INPUT --line-numbers | grep $COMMENT | awk '{print $1}' | xargs -I{} $SUDO iptables -Z INPUT {}
    $SUDO iptables -L OUTPUT --line-numbers | grep $COMMENT | awk '{print $1}' | xargs -I{} $SUDO iptables -Z OUTPUT {}
    $SUDO iptables -L FORWARD --line-numbers | grep $COMMENT | awk '{print $1}' | xargs -I{} $SUDO iptables -Z FORWARD {}
+   reset_counters
+   nft_reset
 }
 
 delete () {
@@ -386,7 +735,9 @@ delete () {
     do
         $SUDO ip6tables -t nat -S | grep $COMMENT | awk -v SUDO="$SUDO" '{$1="";$COMMEND=SUDO" ip6tables -t nat -D "$0; system($COMMEND)}'
     done
+    delete_counters
     save_iptables
+    nft_delete
 }
 
 check () {
@@ -420,6 +771,10 @@ case $i in
     IP_VERSION="${i#*=}"
     shift
     ;;
+    -b=*|--backend=*)
+    BACKEND="${i#*=}"
+    shift
+    ;;
 esac
 done
 
@@ -431,11 +786,15 @@ if [[ ! $IP_VERSION == "4" && ! $IP_VERSION == "6" ]]
 then
     echo "Unsupported forward version: $IP_VERSION" && exit 1
 fi
+if [[ ! $BACKEND == "iptables" && ! $BACKEND == "nftables" ]]
+then
+    echo "Unsupported firewall backend: $BACKEND" && exit 1
+fi
 
 [[ -n $1 ]] && OPERATION=$1
 [[ -z $OPERATION ]] && echo "No operation specified" && exit 1
 [[ -n $2 ]] && LOCAL_PORT=$2
-[[ $OPERATION != "list_all" && $OPERATION != "list_rules" && "$OPERATION" != "check" && ($LOCAL_PORT -ge 65536 || $LOCAL_PORT -lt 0) ]] && \
+[[ $OPERATION != "list_all" && $OPERATION != "list_rules" && "$OPERATION" != "check" && "$OPERATION" != "restore" && ($LOCAL_PORT -ge 65536 || $LOCAL_PORT -lt 0) ]] && \
 echo "Unknow local port for operation $OPERATION" && exit 1
 [[ -n $3 ]] && REMOTE_IP=$3
 [[ $OPERATION == "forward" && -z $REMOTE_IP ]] && echo "Unknow remote ip for operation $OPERATION" && exit 1
@@ -445,12 +804,18 @@ echo "Unknow remote port for operation $OPERATION" && exit 1
 
 check_system
 install_python
-install_iptables
-install_ip6tables
 disable_firewall
-check_ipt_service
-check_ipt6_service
-check_ipt_timer
+if [[ $BACKEND == "nftables" ]]; then
+    install_nft
+    check_nft_service
+else
+    install_iptables
+    install_ip6tables
+    check_ipt_service
+    check_ipt6_service
+    check_ipset_service
+    check_ipt_timer
+fi
 if [[ $OPERATION == "forward" ]]; then
     # for ipt/app -> ipt traffic get
     list
@@ -476,6 +841,9 @@ elif [[ $OPERATION == "delete_service" ]]; then
     delete_service
 elif [[ $OPERATION == "delete" ]]; then
     delete
+elif [[ $OPERATION == "restore" ]]; then
+    shift
+    restore "$@"
 elif [[ $OPERATION == "reset" ]]; then
     reset
 elif [ $OPERATION == "check" ]; then
@@ -485,4 +853,5 @@ else
     echo "Unrecognized command: $OPERATION"
     exit 1
 fi
+nft_commit
 exit 0
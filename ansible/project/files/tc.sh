@@ -84,6 +84,58 @@ function remove_ingress_limit {
     fi
 }
 
+# Server-wide mode: the whole shaping tree of all limited ports is rendered
+# and applied by one `tc -batch`, per-port filters sit in u32 hash tables
+# bucketed by the low byte of the port so lookups do not walk every filter.
+function render_limits {
+    # render_limits <dev> <major> <ht> <sport|dport> <hashkey mask> <limits...>
+    DEV=$1; MAJOR=$2; HT=$3; MATCH=$4; HASHKEY=$5; shift 5
+    echo "qdisc add dev $DEV root handle $MAJOR: htb default 0"
+    echo "filter add dev $DEV parent $MAJOR: prio 1 handle $HT: protocol ip u32 divisor 256"
+    echo "filter add dev $DEV parent $MAJOR: prio 1 protocol ip u32 ht 800:: match u32 0 0 hashkey mask $HASHKEY at 20 link $HT:"
+    for LIMIT in "$@"; do
+        PORT=${LIMIT%%,*}; SPEED=${LIMIT#*,}
+        PORT_ID=$(printf "%x" $PORT)
+        echo "class add dev $DEV parent $MAJOR: classid $MAJOR:$PORT_ID htb rate $SPEED ceil $SPEED"
+        echo "filter add dev $DEV parent $MAJOR: prio 1 protocol ip u32 ht $HT:$(printf "%x" $((PORT & 0xff))): match ip $MATCH $PORT 0xffff flowid $MAJOR:$PORT_ID"
+    done
+}
+
+function sync_limits {
+    # sync_limits <port>,<egress speed>,<ingress speed>..., empty speeds are unlimited
+    EGRESS_LIMITS=()
+    INGRESS_LIMITS=()
+    for SPEC in "$@"; do
+        IFS=, read -r PORT EGRESS_SPEED INGRESS_SPEED <<< "$SPEC"
+        [[ ! $PORT =~ ^[0-9]+$ || $PORT -lt 1 || $PORT -ge 65536 ]] && echo "Invalid port in spec $SPEC" && exit 1
+        [[ -n $EGRESS_SPEED ]] && EGRESS_LIMITS+=("$PORT,$EGRESS_SPEED")
+        [[ -n $INGRESS_SPEED ]] && INGRESS_LIMITS+=("$PORT,$INGRESS_SPEED")
+    done
+    [ $DEBUG -eq 1 ] && echo "Syncing ${#EGRESS_LIMITS[@]} egress and ${#INGRESS_LIMITS[@]} ingress limits..."
+
+    # Dropping the root qdiscs drops every class and filter of the old tree
+    $SUDO tc qdisc del dev $IFACE root > /dev/null 2>&1
+    $SUDO tc qdisc del dev $IFACE ingress > /dev/null 2>&1
+    ip link show $IFB > /dev/null 2>&1 && $SUDO tc qdisc del dev $IFB root > /dev/null 2>&1
+    BATCH=$(mktemp)
+    trap "rm -f $BATCH" EXIT
+    if [[ ${#EGRESS_LIMITS[@]} -gt 0 ]]; then
+        render_limits $IFACE 1 100 sport 0x00ff0000 "${EGRESS_LIMITS[@]}" >> $BATCH
+    fi
+    if [[ ${#INGRESS_LIMITS[@]} -gt 0 ]]; then
+        if [[ ! $(ip link show | grep $IFB) ]]; then
+            $SUDO modprobe ifb numifbs=1
+        fi
+        $SUDO ip link set dev $IFB up
+        echo "qdisc add dev $IFACE handle ffff: ingress" >> $BATCH
+        echo "filter add dev $IFACE parent ffff: protocol ip u32 match u32 0 0 action mirred egress redirect dev $IFB" >> $BATCH
+        render_limits $IFB 2 200 dport 0x000000ff "${INGRESS_LIMITS[@]}" >> $BATCH
+    fi
+    [[ -s $BATCH ]] || exit 0
+    $SUDO tc -batch $BATCH || exit 1
+    exit 0
+}
+
 for i in "$@"
 do
 case $i in
@@ -98,6 +150,11 @@ case $i in
 esac
 done
 
+if [[ $1 == "sync" ]]; then
+    shift
+    sync_limits "$@"
+fi
+
 [ -n $1 ] && PORT=$1 && PORT_ID=$(printf "%x" $PORT)
 
 [ -z $PORT ] && echo "No PORT specified!" && exit 1
@@ -11,7 +11,11 @@ from urllib.parse import urlparse
 
 from app.db.session import get_db
 from app.utils.ip import is_ip
-from app.utils.tasks import trigger_forward_rule, trigger_port_clean
+from app.utils.tasks import (
+    trigger_forward_rule,
+    trigger_iptables_sync,
+    trigger_port_clean,
+)
 from app.db.models.port import Port
 from app.db.models.port_forward import MethodEnum, TypeEnum
 from app.db.schemas.port_forward import (
@@ -43,7 +47,7 @@ forward_rule_router = r = APIRouter()
     "/servers/{server_id}/ports/{port_id}/forward_rule",
     response_model=PortForwardRuleOut,
 )
-async def forward_rule_get(
+def forward_rule_get(
     response: Response,
     server_id: int,
     port_id: int,
@@ -72,7 +76,7 @@ async def forward_rule_get(
     "/servers/{server_id}/ports/{port_id}/forward_rule",
     response_model=PortForwardRuleOut,
 )
-async def forward_rule_create(
+def forward_rule_create(
     response: Response,
     server_id: int,
     port_id: int,
@@ -111,7 +115,7 @@ async def forward_rule_create(
     "/servers/{server_id}/forward_rules",
     response_model=t.List[PortForwardRuleOut],
 )
-async def forward_rules_recreate(
+def forward_rules_recreate(
     response: Response,
     server_id: int,
     db=Depends(get_db),
@@ -122,7 +126,11 @@ async def forward_rules_recreate(
     """
     db_forward_rules = get_forward_rule_for_server(db, server_id)
     for forward_rule in db_forward_rules:
-        trigger_forward_rule(forward_rule)
+        if forward_rule.method != MethodEnum.IPTABLES:
+            trigger_forward_rule(forward_rule)
+    # All iptables rules are applied together in one remote call
+    if any(r.method == MethodEnum.IPTABLES for r in db_forward_rules):
+        trigger_iptables_sync(server_id)
     return db_forward_rules
 
 
@@ -130,7 +138,7 @@ async def forward_rules_recreate(
     "/servers/{server_id}/ports/{port_id}/forward_rule",
     response_model=PortForwardRuleOut,
 )
-async def forward_rule_edit(
+def forward_rule_edit(
     response: Response,
     server_id: int,
     port_id: int,
@@ -168,7 +176,7 @@ async def forward_rule_edit(
     "/servers/{server_id}/ports/{port_id}/forward_rule",
     response_model=PortForwardRuleOut,
 )
-async def forward_rule_delete(
+def forward_rule_delete(
     response: Response,
     server_id: int,
     port_id: int,
@@ -189,7 +197,7 @@ async def forward_rule_delete(
     "/servers/{server_id}/forward_rules",
     response_model=t.List[PortForwardRuleOut],
 )
-async def forward_rules_delete(
+def forward_rules_delete(
     response: Response,
     server_id: int,
     db=Depends(get_db),
@@ -209,7 +217,7 @@ async def forward_rules_delete(
     "/servers/{server_id}/ports/{port_id}/forward_rule/artifacts",
     response_model=PortForwardRuleArtifacts,
 )
-async def forward_rule_runner_get(
+def forward_rule_runner_get(
     response: Response,
     server_id: int,
     port_id: int,
@@ -11,6 +11,8 @@ from fastapi import (
 from fastapi.encoders import jsonable_encoder
 
 from app.db.session import get_db
+from app.db.loaders import PORT_LEAN
+from app.db.models.port import Port
 from app.db.schemas.port import (
     PortOut,
     PortOpsOut,
@@ -28,7 +30,7 @@ from app.db.schemas.port_usage import (
     PortUsageCreate,
 )
 from app.db.crud.port import (
-    get_ports,
+    get_ports_query,
     get_port,
     create_port,
     edit_port,
@@ -62,20 +64,30 @@ ports_router = r = APIRouter()
     response_model=t.Union[t.List[PortOpsOut], t.List[PortOut]],
     response_model_exclude_none=False,
 )
-async def ports_list(
+def ports_list(
     response: Response,
     server_id: int,
     offset: int = 0,
-    limit: int = 100,
+    limit: int = None,
     db=Depends(get_db),
     user=Depends(get_current_active_user),
 ):
     """
     Get all ports related to server
     """
-    ports = get_ports(db, server_id, user)
+    query = get_ports_query(db, server_id, user)
+    ports = (
+        query.options(*PORT_LEAN)
+        .order_by(Port.num)
+        .offset(offset or None)
+        .limit(limit)
+        .all()
+    )
+    total = len(ports) if not offset and limit is None else query.count()
     # This is necessary for react-admin to work
-    response.headers["Content-Range"] = f"0-9/{len(ports)}"
+    response.headers[
+        "Content-Range"
+    ] = f"{offset}-{offset + max(len(ports) - 1, 0)}/{total}"
 
     if user.is_admin():
         return [PortOpsOut(**port.__dict__) for port in ports]
@@ -88,7 +100,7 @@ async def ports_list(
     response_model_exclude_none=False,
     response_model_exclude_unset=False,
 )
-async def port_get(
+def port_get(
     response: Response,
     server_id: int,
     port_id: int,
@@ -118,7 +130,7 @@ async def port_get(
     response_model=PortOpsOut,
     response_model_exclude_none=True,
 )
-async def port_create(
+def port_create(
     request: Request,
     server_id: int,
     port: PortCreate,
@@ -137,7 +149,7 @@ async def port_create(
     response_model=PortOpsOut,
     response_model_exclude_none=True,
 )
-async def port_edit(
+def port_edit(
     request: Request,
     server_id: int,
     port_id: int,
@@ -170,7 +182,7 @@ async def port_edit(
     response_model=PortOpsOut,
     response_model_exclude_none=True,
 )
-async def port_delete(
+def port_delete(
     request: Request,
     server_id: int,
     port_id: int,
@@ -197,7 +209,7 @@ async def port_delete(
     "/servers/{server_id}/ports/{port_id}/users",
     response_model=t.List[PortUserOpsOut],
 )
-async def port_users_get(
+def port_users_get(
     request: Request,
     server_id: int,
     port_id: int,
@@ -215,7 +227,7 @@ async def port_users_get(
     "/servers/{server_id}/ports/{port_id}/users",
     response_model=PortUserOpsOut,
 )
-async def port_user_add(
+def port_user_add(
     request: Request,
     server_id: int,
     port_id: int,
@@ -245,7 +257,7 @@ async def port_user_add(
     "/servers/{server_id}/ports/{port_id}/users/{user_id}",
     response_model=PortUserOpsOut,
 )
-async def port_user_edit(
+def port_user_edit(
     request: Request,
     server_id: int,
     port_id: int,
@@ -269,7 +281,7 @@ async def port_user_edit(
     "/servers/{server_id}/ports/{port_id}/users/{user_id}",
     response_model=PortUserOut,
 )
-async def port_users_delete(
+def port_users_delete(
     request: Request,
     server_id: int,
     port_id: int,
@@ -288,7 +300,7 @@ async def port_users_delete(
     "/servers/{server_id}/ports/{port_id}/usage",
     response_model=PortUsageOut,
 )
-async def port_usage_edit(
+def port_usage_edit(
     server_id: int,
     port_id: int,
     port_usage: PortUsageEdit,
@@ -10,6 +10,8 @@ from fastapi import (
 from fastapi.encoders import jsonable_encoder
 
 from app.db.session import get_db
+from app.db.loaders import SERVER_DETAIL
+from app.db.models.server import Server
 from app.db.schemas.server import (
     ServerOut,
     ServerOpsOut,
@@ -23,7 +25,7 @@ from app.db.schemas.server import (
     ServerUserCreate,
 )
 from app.db.crud.server import (
-    get_servers,
+    get_servers_query,
     get_server,
     create_server,
     edit_server,
@@ -41,7 +43,6 @@ from app.core.auth import (
     get_current_active_admin,
 )
 from app.utils.tasks import (
-    trigger_ansible_hosts,
     trigger_server_init,
     trigger_server_connect,
     trigger_server_clean,
@@ -56,17 +57,24 @@ servers_router = r = APIRouter()
     response_model_exclude_none=False,
     response_model_exclude_unset=False,
 )
-async def servers_list(
+def servers_list(
     response: Response,
     offset: int = 0,
-    limit: int = 100,
+    limit: int = None,
     db=Depends(get_db),
     user=Depends(get_current_active_user),
 ):
     """
     Get all servers
     """
-    servers = get_servers(db, user)
+    servers = (
+        get_servers_query(db, user)
+        .options(*SERVER_DETAIL)
+        .order_by(Server.name)
+        .offset(offset or None)
+        .limit(limit)
+        .all()
+    )
     return servers
 
 
@@ -75,7 +83,7 @@ async def servers_list(
     response_model=t.Union[ServerOpsOut, ServerOut],
     response_model_exclude_none=True,
 )
-async def server_get(
+def server_get(
     response: Response,
     server_id: int,
     db=Depends(get_db),
@@ -97,7 +105,7 @@ async def server_get(
 @r.post(
     "/servers", response_model=ServerOut, response_model_exclude_none=True
 )
-async def server_create(
+def server_create(
     request: Request,
     server: ServerCreate,
     db=Depends(get_db),
@@ -118,7 +126,6 @@ async def server_create(
     server = create_server(db, server)
     if not server or not server.id:
         raise HTTPException(status_code=400, detail="Server creation failed")
-    trigger_ansible_hosts()
     trigger_server_init(server.id, init=True)
     return server
 
@@ -128,7 +135,7 @@ async def server_create(
     response_model=ServerOut,
     response_model_exclude_none=True,
 )
-async def server_edit(
+def server_edit(
     request: Request,
     server_id: int,
     server: ServerEdit,
@@ -146,7 +153,6 @@ async def server_edit(
         server.sudo_password = server.sudo_password.replace("\\", "\\\\")
         server.sudo_password = server.sudo_password.replace('"', '\\"')
     server = edit_server(db, server_id, server)
-    trigger_ansible_hosts()
     if server.config["system"] is None:
         trigger_server_init(server.id)
     return server
@@ -157,7 +163,7 @@ async def server_edit(
     response_model=ServerOpsOut,
     response_model_exclude_none=True,
 )
-async def server_config_edit(
+def server_config_edit(
     request: Request,
     server_id: int,
     server: ServerConfigEdit,
@@ -175,7 +181,7 @@ async def server_config_edit(
     response_model=ServerOpsOut,
     response_model_exclude_none=True,
 )
-async def server_delete(
+def server_delete(
     request: Request,
     server_id: int,
     db=Depends(get_db),
@@ -194,7 +200,7 @@ async def server_delete(
     response_model=ServerOut,
     response_model_exclude_none=True,
 )
-async def server_connect(
+def server_connect(
     request: Request,
     server_id: int,
     connect_arg: ServerConnectArg,
@@ -216,7 +222,7 @@ async def server_connect(
     response_model=t.List[ServerUserOpsOut],
     response_model_exclude_none=True,
 )
-async def server_users_get(
+def server_users_get(
     response: Response,
     server_id: int,
     db=Depends(get_db),
@@ -234,7 +240,7 @@ async def server_users_get(
     "/servers/{server_id}/users",
     response_model=ServerUserOpsOut,
 )
-async def server_users_add(
+def server_users_add(
     response: Response,
     server_id: int,
     server_user: ServerUserCreate,
@@ -252,7 +258,7 @@ async def server_users_add(
     "/servers/{server_id}/users/{user_id}",
     response_model=ServerUserOpsOut,
 )
-async def server_users_edit(
+def server_users_edit(
     response: Response,
     server_id: int,
     user_id: int,
@@ -273,7 +279,7 @@ async def server_users_edit(
     "/servers/{server_id}/users/{user_id}",
     response_model=ServerUserOut,
 )
-async def server_users_delete(
+def server_users_delete(
     response: Response,
     server_id: int,
     user_id: int,
@@ -1,14 +1,20 @@
+import threading
+
 from app.core import security
 
 
-# Monkey patch function we can use to shave a second off our tests by skipping the password hashing check
-def verify_password_mock(first: str, second: str):
+# Monkey patch functions we can use to shave a second off our tests by skipping the password hashing check
+async def verify_password_mock(first: str, second: str):
     return True
 
 
+async def get_password_hash_mock(password: str):
+    return "rehashed"
+
+
 def test_login(client, test_user, monkeypatch):
     # Patch the test to skip password hashing check for speed
-    monkeypatch.setattr(security, "verify_password", verify_password_mock)
+    monkeypatch.setattr(security, "verify_password_async", verify_password_mock)
 
     response = client.post(
         "/api/token",
@@ -17,11 +23,39 @@ def test_login(client, test_user, monkeypatch):
     assert response.status_code == 200
 
 
-def test_signup(client, monkeypatch):
-    def get_password_hash_mock(first: str, second: str):
-        return True
+def test_login_rehashes_password(client, test_db, test_user, monkeypatch):
+    monkeypatch.setattr(security, "verify_password_async", verify_password_mock)
+    monkeypatch.setattr(security, "password_needs_rehash", lambda hashed: True)
+    monkeypatch.setattr(
+        security, "get_password_hash_async", get_password_hash_mock
+    )
+
+    response = client.post(
+        "/api/token",
+        data={"username": test_user.email, "password": "nottheactualpass"},
+    )
+    assert response.status_code == 200
+    test_db.refresh(test_user)
+    assert test_user.hashed_password == "rehashed"
+
 
-    monkeypatch.setattr(security, "get_password_hash", get_password_hash_mock)
+def test_login_hashing_busy(client, test_user, monkeypatch):
+    # Every hashing slot is taken, the login is refused before queueing
+    monkeypatch.setattr(security, "hash_slots", threading.BoundedSemaphore(1))
+    security.hash_slots.acquire()
+
+    response = client.post(
+        "/api/token",
+        data={"username": test_user.email, "password": "nottheactualpass"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_signup(client, monkeypatch):
+    monkeypatch.setattr(
+        security, "get_password_hash_async", get_password_hash_mock
+    )
 
     response = client.post(
         "/api/signup",
@@ -32,7 +66,9 @@ def test_signup(client, monkeypatch):
 
 def test_resignup(client, test_user, monkeypatch):
     # Patch the test to skip password hashing check for speed
-    monkeypatch.setattr(security, "verify_password", verify_password_mock)
+    monkeypatch.setattr(
+        security, "get_password_hash_async", get_password_hash_mock
+    )
 
     response = client.post(
         "/api/signup",
@@ -47,11 +83,11 @@ def test_resignup(client, test_user, monkeypatch):
 def test_wrong_password(
     client, test_db, test_user, test_password, monkeypatch
 ):
-    def verify_password_failed_mock(first: str, second: str):
+    async def verify_password_failed_mock(first: str, second: str):
         return False
 
     monkeypatch.setattr(
-        security, "verify_password", verify_password_failed_mock
+        security, "verify_password_async", verify_password_failed_mock
     )
 
     response = client.post(
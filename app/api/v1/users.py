@@ -3,9 +3,10 @@ from collections import defaultdict
 from fastapi import HTTPException, status
 from fastapi import APIRouter, Request, Depends, Response
 from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 
-from app.core.security import verify_password
-from app.db.session import get_db
+from app.core.security import get_password_hash_async, verify_password_async
+from app.db.session import get_db, release_db
 from app.db.crud.user import (
     get_users_with_ports_usage,
     get_user,
@@ -35,7 +36,11 @@ from app.db.schemas.user import (
     UserServerOut,
 )
 from app.db.schemas.port_usage import PortUsageEdit
-from app.core.auth import get_current_active_user, get_current_active_superuser
+from app.core.auth import (
+    get_current_active_user,
+    get_current_active_superuser,
+    get_current_db_user,
+)
 from app.utils.size import get_readable_size
 from app.utils.tasks import trigger_port_clean
 
@@ -47,7 +52,7 @@ users_router = r = APIRouter()
     response_model=t.List[UserOpsOut],
     response_model_exclude_none=True,
 )
-async def users_list(
+def users_list(
     response: Response,
     db=Depends(get_db),
     current_user=Depends(get_current_active_user),
@@ -77,7 +82,7 @@ async def users_list(
 
 
 @r.get("/users/me", response_model=User, response_model_exclude_none=True)
-async def user_me(current_user=Depends(get_current_active_user)):
+def user_me(current_user=Depends(get_current_db_user)):
     """
     Get own user
     """
@@ -89,31 +94,37 @@ async def user_me_edit(
     request: Request,
     user: MeEdit,
     db=Depends(get_db),
-    current_user=Depends(get_current_active_user),
+    current_user=Depends(get_current_db_user),
 ):
     """
     Update me
     """
+    hashed_password = None
     if user.new_password and not user.prev_password:
         raise HTTPException(
             status.HTTP_400_BAD_REQUEST, detail="No old password provided"
         )
     elif user.prev_password:
-        if not verify_password(
+        await release_db(db)
+        if not await verify_password_async(
             user.prev_password, current_user.hashed_password
         ):
             raise HTTPException(
                 status.HTTP_400_BAD_REQUEST, detail="Password not match"
             )
         user.prev_password = None
-    return edit_me(db, current_user, user)
+        if user.new_password:
+            hashed_password = await get_password_hash_async(user.new_password)
+    return await run_in_threadpool(
+        edit_me, db, current_user, user, hashed_password
+    )
 
 
 @r.get(
     "/users/{user_id}",
     response_model=UserOpsOut,
 )
-async def user_details(
+def user_details(
     request: Request,
     user_id: int,
     db=Depends(get_db),
@@ -136,13 +147,15 @@ async def user_create(
     """
     Create a new user
     """
-    db_user = get_user_by_email(db, user.email)
+    db_user = await run_in_threadpool(get_user_by_email, db, user.email)
     if db_user:
         raise HTTPException(
             status.HTTP_409_CONFLICT,
             detail="Account already exists",
         )
-    return create_user(db, user)
+    await release_db(db)
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_in_threadpool(create_user, db, user, hashed_password)
 
 
 @r.put(
@@ -160,6 +173,18 @@ async def user_edit(
     """
     Update existing user
     """
+    hashed_password = None
+    if user_edit.password:
+        await release_db(db)
+        hashed_password = await get_password_hash_async(user_edit.password)
+    return await run_in_threadpool(
+        edit_user_and_rules, db, user_id, user_edit, hashed_password
+    )
+
+
+def edit_user_and_rules(
+    db, user_id: int, user_edit: UserEdit, hashed_password: str = None
+):
     user = get_user(db, user_id)
     if not user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -187,7 +212,7 @@ async def user_edit(
             )
         for server_user in user.allowed_servers:
             delete_server_user(db, server_user.server_id, user.id)
-    return edit_user(db, user_id, user_edit)
+    return edit_user(db, user_id, user_edit, hashed_password)
 
 
 @r.delete(
@@ -195,7 +220,7 @@ async def user_edit(
     response_model=UserOut,
     response_model_exclude_none=True,
 )
-async def user_delete(
+def user_delete(
     request: Request,
     user_id: int,
     user_delete: UserDelete,
@@ -240,7 +265,7 @@ async def user_delete(
     response_model=t.List[UserServerOut],
     response_model_exclude_none=True,
 )
-async def user_servers_get(
+def user_servers_get(
     request: Request,
     user_id: int,
     db=Depends(get_db),
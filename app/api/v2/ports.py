@@ -1,4 +1,5 @@
 import typing as t
+from datetime import datetime, timedelta, timezone
 from fastapi import (
     APIRouter,
     HTTPException,
@@ -6,12 +7,14 @@ from fastapi import (
     Depends,
     Response,
     encoders,
+    status,
 )
 from fastapi.encoders import jsonable_encoder
-from fastapi_pagination import pagination_params, Page
-from fastapi_pagination.paginator import paginate
+from fastapi_pagination import pagination_params
 
 from app.db.session import get_db
+from app.db.loaders import PORT_LEAN
+from app.db.models.port import Port
 from app.db.schemas.port import (
     PortOut,
     PortOpsOut,
@@ -27,9 +30,10 @@ from app.db.schemas.port_usage import (
     PortUsageEdit,
     PortUsageOut,
     PortUsageCreate,
+    PortUsageHistoryOut,
 )
 from app.db.crud.port import (
-    get_ports,
+    get_ports_query,
     get_port,
     create_port,
     edit_port,
@@ -39,14 +43,24 @@ from app.db.crud.port import (
     edit_port_user,
     delete_port_user,
 )
-from app.db.crud.port_usage import create_port_usage, edit_port_usage
+from app.db.crud.port_usage import (
+    create_port_usage,
+    edit_port_usage,
+    get_port_usage_history,
+)
 from app.db.crud.port_forward import delete_forward_rule
 from app.db.crud.user import get_user
+from app.db.constants import UsageResolutionEnum
+from app.core.config import (
+    USAGE_SAMPLE_RETENTION_DAYS,
+    USAGE_HOURLY_RETENTION_DAYS,
+)
 from app.core.auth import (
     get_current_active_user,
     get_current_active_superuser,
     get_current_active_admin,
 )
+from app.utils.pagination import CursorPage, paginate_query
 from app.utils.tasks import (
     trigger_tc,
     remove_tc,
@@ -57,19 +71,80 @@ from app.utils.tasks import (
 ports_v2_router = r = APIRouter()
 
 
+def to_naive_utc(ts: datetime) -> datetime:
+    """
+    History buckets are stored as naive UTC
+    """
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 @r.get(
     "/servers/{server_id}/ports",
-    response_model=Page[PortOut],
+    response_model=CursorPage[PortOut],
     response_model_exclude_none=False,
     dependencies=[Depends(pagination_params)],
 )
-async def ports_list(
+def ports_list(
     response: Response,
     server_id: int,
+    cursor: str = None,
     db=Depends(get_db),
     user=Depends(get_current_active_user),
 ):
     """
     Get all ports on one server
     """
-    return paginate(get_ports(db, server_id, user))
+    return paginate_query(
+        get_ports_query(db, server_id, user),
+        Port.num,
+        options=PORT_LEAN,
+        cursor=cursor,
+    )
+
+
+@r.get(
+    "/servers/{server_id}/ports/{port_id}/usage/history",
+    response_model=t.List[PortUsageHistoryOut],
+)
+def port_usage_history(
+    response: Response,
+    server_id: int,
+    port_id: int,
+    start: datetime = None,
+    end: datetime = None,
+    resolution: UsageResolutionEnum = None,
+    db=Depends(get_db),
+    user=Depends(get_current_active_user),
+):
+    """
+    Get bucketed traffic usage of a port, resolution is picked from the
+    requested range when not given
+    """
+    port = get_port(db, server_id, port_id)
+    if not port or not (
+        user.is_admin()
+        or any(user.id == u.user_id for u in port.allowed_users)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Port not found"
+        )
+
+    now = datetime.utcnow()
+    end = to_naive_utc(end) if end else now
+    start = to_naive_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be earlier than end",
+        )
+    if resolution is None:
+        # The finest resolution traffic_history_runner still keeps at start
+        if now - start <= timedelta(days=USAGE_SAMPLE_RETENTION_DAYS):
+            resolution = UsageResolutionEnum.MINUTE_10
+        elif now - start <= timedelta(days=USAGE_HOURLY_RETENTION_DAYS):
+            resolution = UsageResolutionEnum.HOUR
+        else:
+            resolution = UsageResolutionEnum.DAY
+    return get_port_usage_history(db, port_id, resolution, start, end)
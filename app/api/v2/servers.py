@@ -7,10 +7,11 @@ from fastapi import (
     Response,
     encoders,
 )
-from fastapi_pagination import pagination_params, Page
-from fastapi_pagination.paginator import paginate
+from fastapi_pagination import pagination_params
 
 from app.db.session import get_db
+from app.db.loaders import SERVER_LEAN, SERVER_USER_LEAN
+from app.db.models.server import Server, ServerUser
 from app.db.schemas.server import (
     ServerOut,
     ServerOpsOut,
@@ -24,14 +25,13 @@ from app.db.schemas.server import (
     ServerUserCreate,
 )
 from app.db.crud.server import (
-    get_servers,
+    get_servers_query,
     get_server,
     create_server,
     edit_server,
     edit_server_config,
     delete_server,
-    get_server_users,
-    get_server_users_for_ops,
+    get_server_users_query,
     add_server_user,
     edit_server_user,
     delete_server_user,
@@ -41,8 +41,8 @@ from app.core.auth import (
     get_current_active_superuser,
     get_current_active_admin,
 )
+from app.utils.pagination import CursorPage, paginate_query
 from app.utils.tasks import (
-    trigger_ansible_hosts,
     trigger_server_connect,
     trigger_server_clean,
 )
@@ -52,20 +52,26 @@ servers_v2_router = r = APIRouter()
 
 @r.get(
     "/servers",
-    response_model=Page[ServerOut],
+    response_model=CursorPage[ServerOut],
     response_model_exclude_none=False,
     response_model_exclude_unset=False,
     dependencies=[Depends(pagination_params)],
 )
-async def servers_list(
+def servers_list(
     response: Response,
+    cursor: str = None,
     db=Depends(get_db),
     user=Depends(get_current_active_user),
 ):
     """
     Get all servers
     """
-    return paginate(get_servers(db, user))
+    return paginate_query(
+        get_servers_query(db, user),
+        Server.name,
+        options=SERVER_LEAN,
+        cursor=cursor,
+    )
 
 
 @r.get(
@@ -73,7 +79,7 @@ async def servers_list(
     response_model=ServerOut,
     response_model_exclude_none=True,
 )
-async def server_get(
+def server_get(
     response: Response,
     server_id: int,
     db=Depends(get_db),
@@ -97,7 +103,7 @@ async def server_get(
     response_model=ServerOpsOut,
     response_model_exclude_none=True,
 )
-async def detailed_server_get(
+def detailed_server_get(
     response: Response,
     server_id: int,
     db=Depends(get_db),
@@ -120,19 +126,23 @@ async def detailed_server_get(
 
 @r.get(
     "/servers/{server_id}/users",
-    response_model=Page[ServerUserOpsOut],
+    response_model=CursorPage[ServerUserOpsOut],
     response_model_exclude_none=True,
     dependencies=[Depends(pagination_params)],
 )
-async def server_users_get(
+def server_users_get(
     response: Response,
     server_id: int,
+    cursor: str = None,
     db=Depends(get_db),
     current_user=Depends(get_current_active_admin),
 ):
     """
     Get server users by id
     """
-    if current_user.is_ops:
-        return paginate(get_server_users_for_ops(db, server_id))
-    return paginate(get_server_users(db, server_id))
+    return paginate_query(
+        get_server_users_query(db, server_id, for_ops=current_user.is_ops),
+        ServerUser.user_id,
+        options=SERVER_USER_LEAN,
+        cursor=cursor,
+    )
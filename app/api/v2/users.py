@@ -2,13 +2,14 @@ import typing as t
 from fastapi import HTTPException, status
 from fastapi import APIRouter, Request, Depends, Response
 from fastapi.encoders import jsonable_encoder
-from fastapi_pagination import pagination_params, Page
-from fastapi_pagination.paginator import paginate
+from fastapi_pagination import pagination_params
 
 from app.core.security import verify_password
 from app.db.session import get_db
+from app.db.loaders import USER_LEAN
+from app.db.models.user import User as DBUser
 from app.db.crud.user import (
-    get_users,
+    get_users_query,
     get_user,
     create_user,
     delete_user,
@@ -33,6 +34,7 @@ from app.db.schemas.user import (
 )
 from app.core.auth import get_current_active_user, get_current_active_admin
 from app.utils.size import get_readable_size
+from app.utils.pagination import CursorPage, paginate_query
 from app.utils.tasks import trigger_port_clean
 
 users_v2_router = r = APIRouter()
@@ -40,17 +42,23 @@ users_v2_router = r = APIRouter()
 
 @r.get(
     "/users",
-    response_model=Page[UserOut],
+    response_model=CursorPage[UserOut],
     response_model_exclude_none=True,
     dependencies=[Depends(pagination_params)],
 )
-async def users_list(
+def users_list(
     response: Response,
     query: str = None,
+    cursor: str = None,
     db=Depends(get_db),
     current_user=Depends(get_current_active_admin),
 ):
     """
-    Search all users
+    Search all users, ordered by email whether they are active or not
     """
-    return paginate(get_users(db, query=query, user=current_user))
+    return paginate_query(
+        get_users_query(db, query=query, user=current_user),
+        DBUser.email,
+        options=USER_LEAN,
+        cursor=cursor,
+    )
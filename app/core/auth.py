@@ -1,15 +1,21 @@
 import jwt
 import traceback
 from fastapi import Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from jwt import PyJWTError
 
 from app.db import models, session, schemas
-from app.db.crud.user import get_user_by_email, create_user
+from app.db.crud.user import (
+    get_user_by_email,
+    create_user,
+    set_password_hash,
+)
 from app.core import security
 from app.core import config
+from app.core.user_cache import user_cache
 
 
-async def get_current_user(
+def get_current_user(
     db=Depends(session.get_db), token: str = Depends(security.oauth2_scheme)
 ):
     credentials_exception = HTTPException(
@@ -28,10 +34,21 @@ async def get_current_user(
         token_data = schemas.user.TokenData(email=email, permissions=permissions)
     except PyJWTError:
         raise credentials_exception
-    user = get_user_by_email(db, token_data.email)
-    if user is None:
-        raise credentials_exception
-    return user
+    if (principal := user_cache.get(token_data.email)) is None:
+        version = user_cache.version
+        user = get_user_by_email(db, token_data.email)
+        if user is None:
+            raise credentials_exception
+        principal = {
+            "id": user.id,
+            "email": user.email,
+            "is_active": user.is_active,
+            "is_ops": user.is_ops,
+            "is_superuser": user.is_superuser,
+        }
+        user_cache.put(token_data.email, principal, version)
+    # Detached, load the row with get_current_db_user when it is needed
+    return models.user.User(**principal)
 
 
 async def get_current_active_user(
@@ -42,6 +59,16 @@ async def get_current_active_user(
     return current_user
 
 
+def get_current_db_user(
+    db=Depends(session.get_db),
+    current_user: models.user.User = Depends(get_current_active_user),
+) -> models.user.User:
+    user = get_user_by_email(db, current_user.email)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
 async def get_current_active_superuser(
     current_user: models.user.User = Depends(get_current_user),
 ) -> models.user.User:
@@ -62,20 +89,28 @@ async def get_current_active_admin(
     return current_user
 
 
-def authenticate_user(db, email: str, password: str):
-    user = get_user_by_email(db, email)
+async def authenticate_user(db, email: str, password: str):
+    user = await run_in_threadpool(get_user_by_email, db, email)
     if not user:
         return False
-    if not security.verify_password(password, user.hashed_password):
+    await session.release_db(db)
+    if not await security.verify_password_async(password, user.hashed_password):
         return False
+    if security.password_needs_rehash(user.hashed_password):
+        hashed_password = await security.get_password_hash_async(password)
+        user = await run_in_threadpool(
+            set_password_hash, db, user.id, hashed_password
+        )
     return user
 
 
-def sign_up_new_user(db, email: str, password: str):
-    user = get_user_by_email(db, email)
-    if user:
+async def sign_up_new_user(db, email: str, password: str):
+    if await run_in_threadpool(get_user_by_email, db, email):
         return False  # User already exists
-    new_user = create_user(
+    await session.release_db(db)
+    hashed_password = await security.get_password_hash_async(password)
+    new_user = await run_in_threadpool(
+        create_user,
         db,
         schemas.user.UserCreate(
             email=email,
@@ -83,5 +118,6 @@ def sign_up_new_user(db, email: str, password: str):
             is_active=True,
             is_superuser=False,
         ),
+        hashed_password,
     )
     return new_user
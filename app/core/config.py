@@ -8,7 +8,32 @@ SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
 ENABLE_SENTRY = os.getenv("ENABLE_SENTRY", False)
 SECRET_KEY = os.getenv("SECRET_KEY", "aurora-admin-panel")
 TRAFFIC_INTERVAL_SECONDS = os.getenv("TRAFFIC_INTERVAL_SECONDS", 600)
+TRAFFIC_CONCURRENCY = int(os.getenv("TRAFFIC_CONCURRENCY", 10))
+TRAFFIC_TIMEOUT_SECONDS = int(os.getenv("TRAFFIC_TIMEOUT_SECONDS", 120))
+# "server" runs traffic.yml per server, "inventory" per shard of servers
+TRAFFIC_SWEEP_MODE = os.getenv("TRAFFIC_SWEEP_MODE", "server")
+TRAFFIC_SHARD_SIZE = int(os.getenv("TRAFFIC_SHARD_SIZE", 50))
+TRAFFIC_FORKS = int(os.getenv("TRAFFIC_FORKS", 20))
+# "ansible" or "ssh", executor of read-only probes such as traffic
+PROBE_EXECUTOR = os.getenv("PROBE_EXECUTOR", "ansible")
 DDNS_INTERVAL_SECONDS = os.getenv("DDNS_INTERVAL_SECONDS", 120)
+USAGE_SAMPLE_SECONDS = 600
+USAGE_SAMPLE_RETENTION_DAYS = int(os.getenv("USAGE_SAMPLE_RETENTION_DAYS", 2))
+USAGE_HOURLY_RETENTION_DAYS = int(os.getenv("USAGE_HOURLY_RETENTION_DAYS", 31))
+USAGE_DAILY_RETENTION_DAYS = int(os.getenv("USAGE_DAILY_RETENTION_DAYS", 730))
+# API handlers run sync DB work in a thread pool of the same size as the
+# connection pool, so no handler thread waits on a connection
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+# bcrypt work factor, hashes of another work factor are redone on login
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 12))
+# Threads hashing passwords and how many more requests may wait for them,
+# further requests are refused with 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 16))
+# Authenticated user principals cached per API process
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 
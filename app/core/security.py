@@ -1,23 +1,89 @@
 import jwt
+import asyncio
+import threading
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from .config import SECRET_KEY
+from concurrent.futures import ThreadPoolExecutor
+from .config import (
+    SECRET_KEY,
+    PASSWORD_HASH_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE,
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=PASSWORD_HASH_ROUNDS
+)
+# bcrypt releases the GIL, so hashing threads don't stall the API threads
+hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+hash_slots = threading.BoundedSemaphore(
+    PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE
+)
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
 
+class PasswordHashBusy(Exception):
+    pass
+
+
+def run_hashing(func, *args):
+    """
+    Run a bcrypt call on the hashing pool, raise PasswordHashBusy at once
+    when its queue is full. The calling thread waits for it, API handlers
+    await run_hashing_async instead.
+    """
+    if not hash_slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    try:
+        return hash_executor.submit(func, *args).result()
+    finally:
+        hash_slots.release()
+
+
+async def run_hashing_async(func, *args):
+    """
+    Await a bcrypt call on the hashing pool from the event loop, so no API
+    thread (nor the DB connection it may hold) waits for it.
+    """
+    if not hash_slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            hash_executor, func, *args
+        )
+    finally:
+        hash_slots.release()
+
+
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return run_hashing(pwd_context.hash, password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return run_hashing(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await run_hashing_async(pwd_context.hash, password)
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> bool:
+    return await run_hashing_async(
+        pwd_context.verify, plain_password, hashed_password
+    )
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
 
 
 def create_access_token(*, data: dict, expires_delta: timedelta = timedelta(days=7)):
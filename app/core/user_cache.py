@@ -0,0 +1,99 @@
+import time
+import threading
+import typing as t
+from collections import OrderedDict
+
+import redis
+
+from app.core import config
+
+
+USER_INVALIDATE_CHANNEL = "aurora:user-invalidate"
+
+
+class UserCache:
+    """
+    In-process TTL/LRU cache of authenticated user principals, keyed by
+    token subject. Changes are published on redis so that every API
+    process drops the subject, the cache is bypassed while this process
+    is not subscribed.
+    """
+
+    def __init__(self, ttl: int, size: int):
+        self.ttl = ttl
+        self.size = size
+        self.entries: t.OrderedDict[str, t.Tuple[float, t.Dict]] = OrderedDict()
+        # Bumped on every drop, a lookup started before it is not stored
+        self.version = 0
+        self.lock = threading.Lock()
+        self.conn = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT)
+        self.listener: t.Optional[threading.Thread] = None
+        self.listening = False
+
+    def get(self, subject: str) -> t.Optional[t.Dict]:
+        self.ensure_listener()
+        if not self.listening:
+            return None
+        with self.lock:
+            if not (entry := self.entries.get(subject)):
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[subject]
+                return None
+            self.entries.move_to_end(subject)
+            return entry[1]
+
+    def put(self, subject: str, principal: t.Dict, version: int) -> None:
+        with self.lock:
+            if not self.listening or version != self.version:
+                return
+            self.entries[subject] = (time.monotonic() + self.ttl, principal)
+            self.entries.move_to_end(subject)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def drop(self, subject: str = None) -> None:
+        with self.lock:
+            self.version += 1
+            if subject is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(subject, None)
+
+    def invalidate(self, *subjects: str) -> None:
+        for subject in subjects:
+            self.drop(subject)
+            try:
+                self.conn.publish(USER_INVALIDATE_CHANNEL, subject)
+            except redis.RedisError as e:
+                print(f"Failed to publish user invalidation: {e}")
+
+    def ensure_listener(self) -> None:
+        if self.listener is not None:
+            return
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(
+                    target=self.listen, name="user-cache", daemon=True
+                )
+                self.listener.start()
+
+    def listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.conn.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(USER_INVALIDATE_CHANNEL)
+                # Anything published while not subscribed is lost
+                self.drop()
+                self.listening = True
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.drop(message["data"].decode())
+            except redis.RedisError as e:
+                print(f"User cache listener failed: {e}")
+            self.listening = False
+            self.drop()
+            time.sleep(1)
+
+
+user_cache = UserCache(config.USER_CACHE_TTL_SECONDS, config.USER_CACHE_SIZE)
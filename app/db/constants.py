@@ -11,3 +11,14 @@ class LimitActionEnum(int, enum.Enum):
     SPEED_LIMIT_100M = 6
     SPEED_LIMIT_1G = 7
     DELETE_RULE = 8
+
+
+class FirewallBackendEnum(str, enum.Enum):
+    IPTABLES = "iptables"
+    NFTABLES = "nftables"
+
+
+class UsageResolutionEnum(str, enum.Enum):
+    MINUTE_10 = "10m"
+    HOUR = "1h"
+    DAY = "1d"
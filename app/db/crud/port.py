@@ -1,6 +1,6 @@
 import typing as t
 from sqlalchemy import and_
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Query, Session, joinedload
 from fastapi import HTTPException, status
 
 from .server import add_server_user
@@ -16,47 +16,41 @@ from app.db.schemas.port import (
     PortUserOut,
     PortUserCreate,
 )
+from app.db.loaders import PORT_DETAIL, PORT_LEAN
 from app.db.models.server import Server, ServerUser
 from app.db.models.port import Port, PortUser
 from app.db.models.port_forward import PortForwardRule
 
 
-def get_ports(
-    db: Session, server_id: int, user: User
-) -> t.List[Port]:
-    if user.is_admin():
-        return (
-            db.query(Port)
-            .filter(Port.server_id == server_id)
-            .options(joinedload(Port.allowed_users).joinedload(PortUser.user))
-            .options(joinedload(Port.forward_rule))
-            .options(joinedload(Port.usage))
-            .order_by(Port.num)
-            .all()
-        )
+def get_ports_query(db: Session, server_id: int, user: User) -> Query:
+    query = db.query(Port).filter(Port.server_id == server_id)
+    if not user.is_admin():
+        query = query.filter(Port.allowed_users.any(user_id=user.id))
+    return query
+
+
+def get_ports(db: Session, server_id: int, user: User) -> t.List[Port]:
     return (
-        db.query(Port)
-        .filter(
-            and_(
-                Port.server_id == server_id,
-                Port.allowed_users.any(user_id=user.id),
-            )
-        )
-        .options(joinedload(Port.allowed_users).joinedload(PortUser.user))
-        .options(joinedload(Port.forward_rule))
-        .options(joinedload(Port.usage))
+        get_ports_query(db, server_id, user)
+        .options(*PORT_LEAN)
         .order_by(Port.num)
         .all()
     )
 
 
+def get_limited_ports(db: Session, server_id: int) -> t.List[Port]:
+    return [
+        port
+        for port in db.query(Port).filter(Port.server_id == server_id).all()
+        if port.config.get("egress_limit") or port.config.get("ingress_limit")
+    ]
+
+
 def get_port(db: Session, server_id: int, port_id: int) -> Port:
     return (
         db.query(Port)
         .filter(and_(Port.server_id == server_id, Port.id == port_id))
-        .options(joinedload(Port.allowed_users).joinedload(PortUser.user))
-        .options(joinedload(Port.forward_rule))
-        .options(joinedload(Port.usage))
+        .options(*PORT_DETAIL)
         .first()
     )
 
@@ -159,12 +159,19 @@ def get_all_gost_rules(db: Session, server_id: int) -> t.List[PortForwardRule]:
     )
 
 
-def get_all_iptables_rules(db: Session) -> t.List[PortForwardRule]:
-    return (
-        db.query(PortForwardRule)
-        .filter(PortForwardRule.method == MethodEnum.IPTABLES)
-        .all()
+def get_all_iptables_rules(
+    db: Session, server_id: int = None
+) -> t.List[PortForwardRule]:
+    query = db.query(PortForwardRule).filter(
+        PortForwardRule.method == MethodEnum.IPTABLES
     )
+    if server_id is not None:
+        query = (
+            query.join(Port)
+            .filter(Port.server_id == server_id)
+            .options(joinedload(PortForwardRule.port))
+        )
+    return query.all()
 
 
 def get_all_expire_rules(db: Session) -> t.List[PortForwardRule]:
@@ -1,6 +1,8 @@
 import typing as t
-from sqlalchemy import and_
+from datetime import datetime
+from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.dialects.postgresql import insert
 
 from app.db.schemas.port_usage import (
     PortUsageBase,
@@ -8,7 +10,19 @@ from app.db.schemas.port_usage import (
     PortUsageEdit,
     PortUsageOut
 )
-from app.db.models.port import PortUsage
+from app.db.constants import UsageResolutionEnum
+from app.db.models.port import (
+    PortUsage,
+    PortUsageSample,
+    PortUsageHourly,
+    PortUsageDaily,
+)
+
+USAGE_HISTORY_MODELS = {
+    UsageResolutionEnum.MINUTE_10: PortUsageSample,
+    UsageResolutionEnum.HOUR: PortUsageHourly,
+    UsageResolutionEnum.DAY: PortUsageDaily,
+}
 
 
 def get_port_usage(db: Session, port_id: int) -> PortUsage:
@@ -40,6 +54,133 @@ def edit_port_usage(
     return db_port_usage
 
 
+def increase_port_usages(
+    db: Session,
+    port_usages: t.List[PortUsageCreate],
+    sample_ts: datetime = None,
+) -> None:
+    if not port_usages:
+        return
+    stmt = insert(PortUsage).values([u.dict() for u in port_usages])
+    stmt = stmt.on_conflict_do_update(
+        constraint="_port_usage_port_id_uc",
+        set_={
+            key: getattr(PortUsage, key) + getattr(stmt.excluded, key)
+            for key in (
+                "download",
+                "upload",
+                "download_accumulate",
+                "upload_accumulate",
+            )
+        },
+    )
+    db.execute(stmt)
+    if sample_ts is not None:
+        add_port_usage_samples(db, port_usages, sample_ts)
+    db.commit()
+
+
+def add_port_usage_samples(
+    db: Session, port_usages: t.List[PortUsageCreate], sample_ts: datetime
+) -> None:
+    samples = [
+        {
+            "port_id": u.port_id,
+            "bucket_ts": sample_ts,
+            "download": u.download,
+            "upload": u.upload,
+        }
+        for u in port_usages
+        if u.download or u.upload
+    ]
+    if not samples:
+        return
+    stmt = insert(PortUsageSample).values(samples)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["port_id", "bucket_ts"],
+        set_={
+            "download": PortUsageSample.download + stmt.excluded.download,
+            "upload": PortUsageSample.upload + stmt.excluded.upload,
+        },
+    )
+    db.execute(stmt)
+
+
+def rollup_port_usage_history(
+    db: Session,
+    source: UsageResolutionEnum,
+    target: UsageResolutionEnum,
+    since: datetime,
+) -> None:
+    """
+    Recompute the target buckets from `since` out of the finer source
+    buckets, `since` must stay within the retention of the source.
+    """
+    source_model = USAGE_HISTORY_MODELS[source]
+    target_model = USAGE_HISTORY_MODELS[target]
+    bucket_ts = func.date_trunc(
+        "hour" if target == UsageResolutionEnum.HOUR else "day",
+        source_model.bucket_ts,
+    )
+    stmt = insert(target_model).from_select(
+        ["port_id", "bucket_ts", "download", "upload"],
+        select(
+            [
+                source_model.port_id,
+                bucket_ts,
+                func.sum(source_model.download),
+                func.sum(source_model.upload),
+            ]
+        )
+        .where(source_model.bucket_ts >= since)
+        .group_by(source_model.port_id, bucket_ts),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["port_id", "bucket_ts"],
+        set_={
+            "download": stmt.excluded.download,
+            "upload": stmt.excluded.upload,
+        },
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def prune_port_usage_history(
+    db: Session, resolution: UsageResolutionEnum, before: datetime
+) -> int:
+    model = USAGE_HISTORY_MODELS[resolution]
+    deleted = (
+        db.query(model)
+        .filter(model.bucket_ts < before)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def get_port_usage_history(
+    db: Session,
+    port_id: int,
+    resolution: UsageResolutionEnum,
+    start: datetime,
+    end: datetime,
+) -> t.List[PortUsageSample]:
+    model = USAGE_HISTORY_MODELS[resolution]
+    return (
+        db.query(model)
+        .filter(
+            and_(
+                model.port_id == port_id,
+                model.bucket_ts >= start,
+                model.bucket_ts < end,
+            )
+        )
+        .order_by(model.bucket_ts)
+        .all()
+    )
+
+
 def delete_port_usage(db: Session, port_id: int) -> PortUsage:
     db_port_usage = get_port_usage(db, port_id)
     if not db_port_usage:
@@ -1,8 +1,14 @@
 import typing as t
-from sqlalchemy import and_
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Query, Session, joinedload
 from fastapi import HTTPException
 
+from app.db.loaders import (
+    SERVER_DETAIL,
+    SERVER_PORTS_WORKER,
+    SERVER_USER_LEAN,
+    SERVER_WORKER,
+)
 from app.db.models.user import User
 from app.db.schemas.server import (
     ServerCreate,
@@ -12,28 +18,21 @@ from app.db.schemas.server import (
     ServerUserCreate,
 )
 from app.db.models.server import Server, ServerUser
-from app.db.models.port import Port
+from app.db.models.port import Port, PortUser, PortUsage
 
 
-def get_servers(db: Session, user: User = None) -> t.List[Server]:
+def get_servers_query(db: Session, user: User = None) -> Query:
+    query = db.query(Server).filter(Server.is_active == True)
     # Only superuser can see all the servers.
-    if not user or user.is_superuser:
-        return (
-            db.query(Server)
-            .filter(Server.is_active == True)
-            .options(joinedload(Server.ports).joinedload(Port.allowed_users))
-            .order_by(Server.name)
-            .all()
-        )
+    if user and not user.is_superuser:
+        query = query.filter(Server.allowed_users.any(user_id=user.id))
+    return query
+
+
+def get_servers(db: Session, user: User = None) -> t.List[Server]:
     return (
-        db.query(Server)
-        .filter(
-            and_(
-                Server.is_active == True,
-                Server.allowed_users.any(user_id=user.id),
-            )
-        )
-        .options(joinedload(Server.ports).joinedload(Port.allowed_users))
+        get_servers_query(db, user)
+        .options(*SERVER_WORKER)
         .order_by(Server.name)
         .all()
     )
@@ -43,7 +42,7 @@ def get_server(db: Session, server_id: int) -> Server:
     return (
         db.query(Server)
         .filter(and_(Server.id == server_id, Server.is_active == True))
-        .options(joinedload(Server.ports).joinedload(Port.allowed_users))
+        .options(*SERVER_DETAIL)
         .first()
     )
 
@@ -52,7 +51,7 @@ def get_server_with_ports_usage(db: Session, server_id: int) -> Server:
     return (
         db.query(Server)
         .filter(and_(Server.id == server_id, Server.is_active == True))
-        .options(joinedload(Server.ports).joinedload(Port.usage))
+        .options(*SERVER_PORTS_WORKER)
         .first()
     )
 
@@ -116,26 +115,49 @@ def delete_server(db: Session, server_id: int) -> Server:
     return db_server
 
 
+def get_server_users_query(
+    db: Session, server_id: int, for_ops: bool = False
+) -> Query:
+    query = db.query(ServerUser).filter(ServerUser.server_id == server_id)
+    if for_ops:
+        query = query.join(User).filter(User.is_ops == False)
+    return query
+
+
 def get_server_users(db: Session, server_id: int) -> t.List[ServerUser]:
-    server_users = (
-        db.query(ServerUser)
-        .filter(ServerUser.server_id == server_id)
-        .options(joinedload(ServerUser.user))
+    return (
+        get_server_users_query(db, server_id)
+        .options(*SERVER_USER_LEAN)
         .all()
     )
-    return server_users
+
+
+def get_server_users_usage(
+    db: Session, server_id: int
+) -> t.Dict[int, t.Tuple[int, int]]:
+    return {
+        user_id: (download, upload)
+        for user_id, download, upload in (
+            db.query(
+                PortUser.user_id,
+                func.coalesce(func.sum(PortUsage.download), 0),
+                func.coalesce(func.sum(PortUsage.upload), 0),
+            )
+            .join(Port, Port.id == PortUser.port_id)
+            .join(PortUsage, PortUsage.port_id == Port.id)
+            .filter(Port.server_id == server_id)
+            .group_by(PortUser.user_id)
+            .all()
+        )
+    }
 
 
 def get_server_users_for_ops(db: Session, server_id: int) -> t.List[ServerUser]:
-    server_users = (
-        db.query(ServerUser)
-        .join(User)
-        .filter(ServerUser.server_id == server_id)
-        .filter(User.is_ops == False)
-        .options(joinedload(ServerUser.user))
+    return (
+        get_server_users_query(db, server_id, for_ops=True)
+        .options(*SERVER_USER_LEAN)
         .all()
     )
-    return server_users
 
 
 def get_server_user(db: Session, server_id: int, user_id: int) -> ServerUser:
@@ -1,11 +1,13 @@
 import typing as t
 from fastapi import HTTPException, status
 from sqlalchemy import and_
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
 from sqlalchemy import func
 from sqlalchemy import and_, or_
 
 from app.core.security import get_password_hash
+from app.core.user_cache import user_cache
+from app.db.loaders import USER_DETAIL, USER_LEAN
 from app.db.models.port import Port, PortUser
 from app.db.models.server import Server, ServerUser
 from app.db.models.user import User
@@ -20,8 +22,7 @@ def get_user(db: Session, user_id: int) -> User:
     user = (
         db.query(User)
         .filter(User.id == user_id)
-        .options(joinedload(User.allowed_servers))
-        .options(joinedload(User.allowed_ports))
+        .options(*USER_DETAIL)
         .first()
     )
     if not user:
@@ -33,7 +34,9 @@ def get_user_by_email(db: Session, email: str) -> User:
     return db.query(User).filter(User.email == email).first()
 
 
-def get_users(db: Session, query: str = None, user: User = None):
+def get_users_query(
+    db: Session, query: str = None, user: User = None
+) -> Query:
     q = db.query(User).filter(User.is_superuser == False)
     if user and user.is_ops:
         q = db.query(User).filter(User.is_ops == False)
@@ -44,29 +47,24 @@ def get_users(db: Session, query: str = None, user: User = None):
                 func.lower(User.notes).like(f"%{query}%"),
             )
         )
+    return q
+
+
+def get_users(db: Session, query: str = None, user: User = None):
     return (
-        q.options(joinedload(User.allowed_servers))
-        .options(joinedload(User.allowed_ports))
+        get_users_query(db, query, user)
+        .options(*USER_LEAN)
         .order_by(User.is_active.desc(), User.notes.asc(), User.email.asc())
         .all()
     )
 
 
 def get_users_with_ports_usage(db: Session, query: str = None, user: User = None):
-    q = db.query(User).filter(User.is_superuser == False)
-    if user and user.is_ops:
-        q = db.query(User).filter(User.is_ops == False)
-    if query is not None:
-        q = q.filter(
-            or_(
-                func.lower(User.email).like(f"%{query}%"),
-                func.lower(User.notes).like(f"%{query}%"),
-            )
-        )
     return (
-        q.options(joinedload(User.allowed_servers))
+        get_users_query(db, query, user)
+        .options(selectinload(User.allowed_servers))
         .options(
-            joinedload(User.allowed_ports)
+            selectinload(User.allowed_ports)
             .joinedload(PortUser.port)
             .joinedload(Port.usage)
         )
@@ -75,8 +73,9 @@ def get_users_with_ports_usage(db: Session, query: str = None, user: User = None
     )
 
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: str = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = User(
         first_name=user.first_name,
         last_name=user.last_name,
@@ -94,20 +93,35 @@ def create_user(db: Session, user: UserCreate):
     return get_user(db, db_user.id)
 
 
+def set_password_hash(db: Session, user_id: int, hashed_password: str) -> User:
+    db_user = get_user(db, user_id)
+    db_user.hashed_password = hashed_password
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
 def delete_user(db: Session, user: User) -> User:
     db.delete(user)
     db.commit()
+    user_cache.invalidate(user.email)
     return user
 
 
-def edit_user(db: Session, user_id: int, user: UserEdit) -> User:
+def edit_user(
+    db: Session, user_id: int, user: UserEdit, hashed_password: str = None
+) -> User:
     db_user = get_user(db, user_id)
     if not db_user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
+    prev_email = db_user.email
     update_data = user.dict(exclude_unset=True)
 
     if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(user.password)
+        update_data["hashed_password"] = hashed_password or get_password_hash(
+            user.password
+        )
         del update_data["password"]
 
     for key, value in update_data.items():
@@ -116,22 +130,29 @@ def edit_user(db: Session, user_id: int, user: UserEdit) -> User:
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(prev_email, db_user.email)
     return get_user(db, db_user.id)
 
 
-def edit_me(db: Session, db_user: User, user: MeEdit) -> User:
+def edit_me(
+    db: Session, db_user: User, user: MeEdit, hashed_password: str = None
+) -> User:
     update_data = user.dict(exclude_unset=True)
 
     if "new_password" in update_data:
-        update_data["hashed_password"] = get_password_hash(user.new_password)
+        update_data["hashed_password"] = hashed_password or get_password_hash(
+            user.new_password
+        )
         del update_data["new_password"]
 
+    prev_email = db_user.email
     for key, value in update_data.items():
         setattr(db_user, key, value)
 
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(prev_email, db_user.email)
     return db_user
 
 
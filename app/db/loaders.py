@@ -0,0 +1,77 @@
+"""
+Loader profiles, the relations and columns loaded along with the rows of
+a query. Collections are loaded with selectinload, one extra query per
+relation however many rows there are, instead of joins that multiply
+the rows, and columns the caller never reads are left out.
+
+    lean:   list endpoints, only what their response schema renders
+    detail: single object endpoints and their edits
+    worker: huey tasks, credentials and config, plus the user relations
+            the limit checks walk for every port
+"""
+from sqlalchemy.orm import (
+    defer,
+    joinedload,
+    lazyload,
+    load_only,
+    selectinload,
+)
+
+from app.db.models.port import Port, PortUser
+from app.db.models.server import Server, ServerUser
+from app.db.models.user import User
+
+
+SERVER_LEAN = (
+    load_only(Server.id, Server.name, Server.address, Server.config),
+    lazyload(Server.allowed_users),
+    selectinload(Server.ports).load_only(
+        Port.id, Port.num, Port.external_num, Port.server_id
+    ),
+    selectinload(Server.ports)
+    .selectinload(Port.allowed_users)
+    .load_only(PortUser.port_id, PortUser.user_id),
+    selectinload(Server.ports).lazyload(Port.forward_rule),
+    selectinload(Server.ports).lazyload(Port.usage),
+)
+
+SERVER_DETAIL = (
+    selectinload(Server.allowed_users).joinedload(ServerUser.user),
+    selectinload(Server.ports).selectinload(Port.allowed_users),
+)
+
+SERVER_WORKER = (lazyload(Server.allowed_users),)
+
+SERVER_PORTS_WORKER = (
+    selectinload(Server.allowed_users),
+    selectinload(Server.ports).selectinload(Port.allowed_users),
+)
+
+SERVER_USER_LEAN = (
+    joinedload(ServerUser.user).load_only(
+        User.id, User.email, User.is_active, User.is_ops
+    ),
+)
+
+PORT_LEAN = (
+    selectinload(Port.allowed_users)
+    .joinedload(PortUser.user)
+    .load_only(User.id, User.email, User.is_active),
+)
+
+PORT_DETAIL = (selectinload(Port.allowed_users).joinedload(PortUser.user),)
+
+USER_LEAN = (
+    defer(User.hashed_password),
+    selectinload(User.allowed_servers).load_only(
+        ServerUser.user_id, ServerUser.server_id
+    ),
+    selectinload(User.allowed_ports).load_only(
+        PortUser.user_id, PortUser.port_id
+    ),
+)
+
+USER_DETAIL = (
+    selectinload(User.allowed_servers),
+    selectinload(User.allowed_ports),
+)
@@ -1,7 +1,8 @@
 from .base import Base
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.mutable import MutableDict
-from sqlalchemy import Boolean, Column, Integer, String, JSON, ForeignKey, UniqueConstraint, BigInteger, Text
+from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy import Boolean, Column, Integer, String, JSON, ForeignKey, UniqueConstraint, BigInteger, Text, DateTime
 
 from app.db.models.port_forward import PortForwardRule, MethodEnum
 
@@ -23,7 +24,7 @@ class Port(Base):
 
     server = relationship("Server", back_populates="ports")
     users = relationship("User", secondary="port_user", back_populates="ports")
-    allowed_users = relationship("PortUser", cascade="all,delete", back_populates="port", lazy='joined')
+    allowed_users = relationship("PortUser", cascade="all,delete", back_populates="port", lazy='selectin')
     forward_rule = relationship("PortForwardRule", uselist=False, cascade="all,delete", back_populates="port", lazy='joined')
     usage = relationship("PortUsage", uselist=False, cascade="all,delete", back_populates="port", lazy='joined')
 
@@ -57,3 +58,29 @@ class PortUsage(Base):
     upload_checkpoint = Column(BigInteger, nullable=False, default=lambda: 0)
 
     port = relationship("Port", back_populates="usage")
+
+
+class PortUsageSampleMixin:
+    @declared_attr
+    def port_id(cls):
+        return Column(
+            Integer,
+            ForeignKey("port.id", ondelete="CASCADE"),
+            primary_key=True,
+        )
+
+    bucket_ts = Column(DateTime, primary_key=True, index=True)
+    download = Column(BigInteger, nullable=False, default=lambda: 0)
+    upload = Column(BigInteger, nullable=False, default=lambda: 0)
+
+
+class PortUsageSample(PortUsageSampleMixin, Base):
+    __tablename__ = "port_usage_sample"
+
+
+class PortUsageHourly(PortUsageSampleMixin, Base):
+    __tablename__ = "port_usage_hourly"
+
+
+class PortUsageDaily(PortUsageSampleMixin, Base):
+    __tablename__ = "port_usage_daily"
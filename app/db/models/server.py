@@ -69,5 +69,5 @@ class Server(Base):
         "ServerUser",
         cascade="all,delete",
         back_populates="server",
-        lazy="joined",
+        lazy="selectin",
     )
@@ -1,4 +1,5 @@
 import typing as t
+from datetime import datetime
 from pydantic import BaseModel, validator
 
 from app.utils.size import get_readable_size
@@ -42,3 +43,12 @@ class PortUsageEdit(PortUsageBase):
     upload_accumulate: t.Optional[int]
     download_checkpoint: t.Optional[int]
     upload_checkpoint: t.Optional[int]
+
+
+class PortUsageHistoryOut(BaseModel):
+    bucket_ts: datetime
+    download: int
+    upload: int
+
+    class Config:
+        orm_mode = True
@@ -2,7 +2,7 @@ import typing as t
 from pydantic import BaseModel, validator
 
 from app.utils.size import get_readable_size
-from app.db.constants import LimitActionEnum
+from app.db.constants import FirewallBackendEnum, LimitActionEnum
 
 
 class UserOut(BaseModel):
@@ -105,6 +105,7 @@ class ServerConfig(BaseModel):
     iperf_disabled: t.Optional[bool]
     haproxy: t.Optional[str]
     haproxy_disabled: t.Optional[bool]
+    firewall: t.Optional[FirewallBackendEnum]
 
 
 class ServerBase(BaseModel):
@@ -204,6 +205,7 @@ class ServerConfigEdit(BaseModel):
     realm_disabled: t.Optional[bool]
     iperf_disabled: t.Optional[bool]
     haproxy_disabled: t.Optional[bool]
+    firewall: t.Optional[FirewallBackendEnum]
 
     class Config:
         orm_mode = True
@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 from fastapi import Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
@@ -8,7 +9,8 @@ from app.core import config
 
 engine = create_engine(
     config.SQLALCHEMY_DATABASE_URI,
-    pool_size=20, max_overflow=5
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
 )
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
@@ -26,3 +28,12 @@ def db_session():
 
 def get_db(request: Request):
     return request.state.db
+
+
+async def release_db(db: Session):
+    """
+    Give the connection of a request session back to the pool before
+    awaiting slow non DB work, e.g. bcrypt. Loaded objects stay readable
+    and the session checks a connection out again on its next query.
+    """
+    await run_in_threadpool(db.close)
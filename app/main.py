@@ -1,10 +1,13 @@
+import asyncio
 import uvicorn
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.exc import IntegrityError
 from fastapi.responses import JSONResponse
 from fastapi import FastAPI, Depends, Request
 from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from app.api.v1.auth import auth_router
 from app.api.v1.users import users_router
@@ -16,8 +19,9 @@ from app.api.v2.ports import ports_v2_router
 from app.api.v2.users import users_v2_router
 from app.db.crud.server import get_server, get_server_with_ports_usage
 from app.core import config
-from app.db.session import db_session
+from app.db.session import SessionLocal, db_session
 from app.core.auth import get_current_active_user
+from app.core.security import PasswordHashBusy
 from app.utils.ip import get_external_ip
 
 
@@ -51,21 +55,46 @@ async def sentry_exception(request: Request, call_next):
         raise e
 
 
+@app.exception_handler(PasswordHashBusy)
+async def password_hash_busy(request: Request, exc: PasswordHashBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password checks, retry later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.on_event("startup")
+def bound_threadpool():
+    """
+    Sync handlers and dependencies run in the loop's default executor,
+    bound it to the connection pool size.
+    """
+    asyncio.get_event_loop().set_default_executor(
+        ThreadPoolExecutor(
+            max_workers=config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW
+        )
+    )
+
+
 @app.middleware("http")
 async def db_session_middleware(request: Request, call_next):
-    with db_session() as db:
-        request.state.db = db
-        try:
-            response = await call_next(request)
-            return response
-        except IntegrityError as e:
-            return JSONResponse(
-                status_code=400,
-                content={"detail": str(e.orig)})
+    db = SessionLocal()
+    request.state.db = db
+    try:
+        response = await call_next(request)
+        return response
+    except IntegrityError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"detail": str(e.orig)})
+    finally:
+        # Returning the connection to the pool rolls it back, off the loop
+        await run_in_threadpool(db.close)
 
 
 @app.get("/api/v1")
-async def root():
+def root():
     with db_session() as db:
         server = get_server_with_ports_usage(db, 34)
     print([p for p in server.ports])
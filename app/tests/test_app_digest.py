@@ -0,0 +1,76 @@
+import pytest
+
+from app.db.models.port import Port
+from app.db.models.port_forward import PortForwardRule
+from app.db.models.server import Server
+from tasks.app import is_rule_deployed
+from tasks.functions import base
+from tasks.functions.gost import GostConfig
+
+
+def make_port(num=1000, retries=0, version="2.11.1"):
+    port = Port(id=num, num=num, server=Server(config={"gost": version}))
+    port.forward_rule = PortForwardRule(
+        port=port, config={"Retries": retries}
+    )
+    return port
+
+
+def digest(port, **attrs):
+    config = GostConfig().apply(None, port)
+    for name, value in attrs.items():
+        setattr(config, name, value)
+    return config.get_digest(port)
+
+
+def test_digest_is_deterministic():
+    assert digest(make_port()) == digest(make_port())
+
+
+@pytest.mark.parametrize(
+    "port, attrs",
+    [
+        (make_port(retries=3), {}),
+        (make_port(), {"app_command": "/usr/local/bin/gost -V"}),
+        (make_port(version="2.11.2"), {}),
+    ],
+    ids=["config", "command", "version"],
+)
+def test_digest_changes(port, attrs):
+    assert digest(port, **attrs) != digest(make_port())
+
+
+def test_digest_changes_with_template(monkeypatch):
+    before = digest(make_port())
+    monkeypatch.setattr(base, "get_md5_for_file", lambda path: "changed")
+    assert digest(make_port()) != before
+
+
+def test_apply_all_leaves_config_alone():
+    config = GostConfig()
+    ports = [make_port(1000), make_port(1001, retries=3)]
+    deployments = config.apply_all(None, ports)
+    assert [d["app_digest"] for d in deployments] == [
+        digest(port) for port in ports
+    ]
+    assert "app_digest" not in config.extravars
+
+
+@pytest.mark.parametrize(
+    "config, status, deployed",
+    [
+        ({"digest": "a", "reported_digest": "a"}, "successful", True),
+        ({"digest": "a", "reported_digest": "b"}, "successful", False),
+        ({"digest": "b", "reported_digest": "a"}, "successful", False),
+        ({"digest": "a"}, "successful", False),
+        ({"digest": "a", "reported_digest": "a"}, "failed", False),
+        (
+            {"digest": "a", "reported_digest": "a", "reverse_proxy": 1},
+            "successful",
+            False,
+        ),
+    ],
+)
+def test_is_rule_deployed(config, status, deployed):
+    rule = PortForwardRule(config=config, status=status)
+    assert is_rule_deployed(rule, "a") == deployed
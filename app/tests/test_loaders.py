@@ -0,0 +1,195 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from fastapi_pagination.params import PaginationParams
+
+from app.db.loaders import PORT_LEAN, SERVER_LEAN, USER_LEAN
+from app.db.models.base import Base
+from app.db.models.port import Port, PortUsage, PortUser
+from app.db.models.server import Server, ServerUser
+from app.db.models.user import User
+from app.db.crud.port import get_ports_query
+from app.db.crud.server import (
+    get_server,
+    get_servers,
+    get_servers_query,
+    get_server_with_ports_usage,
+)
+from app.db.crud.user import get_users_query
+from app.utils.pagination import paginate_query
+
+SERVERS, PORTS, USERS = 3, 4, 5
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    users = [
+        User(email=f"user{i}@example.com", hashed_password="x")
+        for i in range(USERS)
+    ]
+    db.add_all(users)
+    db.flush()
+    for i in range(SERVERS):
+        server = Server(
+            name=f"server{i}",
+            address=f"10.0.0.{i}",
+            ansible_name=f"server{i}",
+            ansible_host=f"10.0.0.{i}",
+            config={},
+        )
+        db.add(server)
+        db.flush()
+        for user in users:
+            db.add(ServerUser(server_id=server.id, user_id=user.id, config={}))
+        for num in range(PORTS):
+            port = Port(num=1000 + num, server_id=server.id, config={})
+            db.add(port)
+            db.flush()
+            db.add(PortUsage(port_id=port.id))
+            for user in users:
+                db.add(PortUser(port_id=port.id, user_id=user.id, config={}))
+    db.commit()
+    db.close()
+    return engine
+
+
+@pytest.fixture
+def queries(engine):
+    """
+    Statements executed while the test runs, count_rows replays them to
+    get the number of rows each one returned.
+    """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def count_rows(engine, executed):
+    """
+    Rows of the main query first, then of the relation loads sorted as
+    their order between sibling relations is not fixed.
+    """
+    cursor = engine.raw_connection().cursor()
+    rows = [
+        len(cursor.execute(statement, parameters).fetchall())
+        for statement, parameters in executed
+    ]
+    return rows[:1] + sorted(rows[1:])
+
+
+def test_servers_list_is_lean(engine, queries):
+    db = sessionmaker(bind=engine)()
+    page = paginate_query(
+        get_servers_query(db),
+        Server.name,
+        options=SERVER_LEAN,
+        params=PaginationParams(page=0, size=10),
+    )
+    assert len(page.items) == SERVERS
+    assert all(len(server.ports) == PORTS for server in page.items)
+    # count, servers, their ports and the ports' users: no join fan-out
+    assert count_rows(engine, queries) == [
+        1,
+        SERVERS,
+        SERVERS * PORTS,
+        SERVERS * PORTS * USERS,
+    ]
+    assert "ssh_password" not in queries[1][0]
+    assert "config" not in queries[3][0]
+
+
+def test_server_detail(engine, queries):
+    db = sessionmaker(bind=engine)()
+    server = get_server(db, 1)
+    assert len(server.allowed_users) == USERS
+    assert server.allowed_users[0].user.email
+    assert all(len(port.allowed_users) == USERS for port in server.ports)
+    assert count_rows(engine, queries) == [1, PORTS, USERS, PORTS * USERS]
+
+
+def test_servers_worker(engine, queries):
+    db = sessionmaker(bind=engine)()
+    assert len(get_servers(db)) == SERVERS
+    assert count_rows(engine, queries) == [SERVERS]
+
+    queries.clear()
+    server = get_server_with_ports_usage(db, 1)
+    db.close()
+    assert all(port.usage.download == 0 for port in server.ports)
+    # check_server_limits walks the users of the server and of every port
+    assert len(server.allowed_users) == USERS
+    assert all(len(port.allowed_users) == USERS for port in server.ports)
+    assert count_rows(engine, queries) == [1, PORTS, USERS, PORTS * USERS]
+
+
+def test_ports_list_is_lean(engine, queries):
+    db = sessionmaker(bind=engine)()
+    admin = User(is_superuser=True)
+    page = paginate_query(
+        get_ports_query(db, 1, admin),
+        Port.num,
+        options=PORT_LEAN,
+        params=PaginationParams(page=0, size=2),
+    )
+    assert [port.num for port in page.items] == [1000, 1001]
+    assert count_rows(engine, queries) == [1, 2, 2 * USERS]
+
+
+def test_users_list_is_lean(engine, queries):
+    db = sessionmaker(bind=engine)()
+    page = paginate_query(
+        get_users_query(db),
+        User.email,
+        options=USER_LEAN,
+        params=PaginationParams(page=0, size=USERS),
+    )
+    assert all(
+        len(user.allowed_ports) == SERVERS * PORTS for user in page.items
+    )
+    assert count_rows(engine, queries) == [
+        1,
+        USERS,
+        USERS * SERVERS,
+        USERS * SERVERS * PORTS,
+    ]
+    assert "hashed_password" not in queries[1][0]
+
+
+def test_cursor_pages_break_key_ties(engine):
+    db = sessionmaker(bind=engine)()
+    # Port numbers repeat across servers, the cursor carries the id too
+    ids, cursor = [], None
+    while True:
+        page = paginate_query(
+            db.query(Port),
+            Port.num,
+            cursor=cursor,
+            params=PaginationParams(page=0, size=5),
+        )
+        ids += [port.id for port in page.items]
+        if cursor is None:
+            first_cursor = page.next_cursor
+        else:
+            assert page.page is None
+        if not (cursor := page.next_cursor):
+            break
+    assert sorted(ids) == list(range(1, SERVERS * PORTS + 1))
+    assert len(ids) == len(set(ids))
+
+    with pytest.raises(HTTPException) as e:
+        paginate_query(
+            db.query(Port),
+            Port.num,
+            cursor=first_cursor,
+            params=PaginationParams(page=1, size=5),
+        )
+    assert e.value.status_code == 400
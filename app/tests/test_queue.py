@@ -0,0 +1,50 @@
+import pytest
+
+from tasks import traffic
+from tasks.config import huey
+from tasks.queue import (
+    SERVER_QUEUE_HANDLERS,
+    SERVER_QUEUE_KEY,
+    enqueue_server_task,
+    server_queue_handler,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def immediate_huey(monkeypatch):
+    """
+    Run tasks inline but keep the redis storage, locks and server queues
+    live in it.
+    """
+    monkeypatch.setattr(huey.storage, "conn", fakeredis.FakeRedis())
+    monkeypatch.setattr(huey, "immediate_use_memory", False)
+    huey.immediate = True
+    yield huey
+    huey.immediate = False
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    batches = []
+    monkeypatch.setitem(SERVER_QUEUE_HANDLERS, "test", None)
+    server_queue_handler("test", key=lambda op: op["n"])(
+        lambda server_id, ops: batches.append((server_id, ops))
+    )
+    return batches
+
+
+def test_ops_enqueued_during_traffic_are_drained(
+    immediate_huey, handled, monkeypatch
+):
+    def probe_traffic(server_id, executor=None):
+        # The op cannot run now, the sweep holds the server lock
+        enqueue_server_task(server_id, "test", n=1)
+        assert handled == []
+        return "successful"
+
+    monkeypatch.setattr(traffic, "probe_traffic", probe_traffic)
+    assert traffic.collect_traffic(1) == "successful"
+    assert handled == [(1, [{"n": 1}])]
+    assert not huey.storage.conn.llen(SERVER_QUEUE_KEY.format(server_id=1))
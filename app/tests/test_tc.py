@@ -0,0 +1,16 @@
+from tasks.tc import get_tc_sync_args
+
+
+def test_get_tc_sync_args():
+    assert get_tc_sync_args(
+        [
+            {"port_num": 1000, "egress_limit": 100, "ingress_limit": 200},
+            {"port_num": 1001, "egress_limit": None, "ingress_limit": 300},
+            {"port_num": 1002, "egress_limit": 400},
+        ]
+    ) == " sync 1000,100kbit,200kbit 1001,,300kbit 1002,400kbit,"
+
+
+def test_get_tc_sync_args_without_limits():
+    # tc.sh drops the whole tree when syncing no spec
+    assert get_tc_sync_args([]) == " sync "
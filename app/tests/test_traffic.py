@@ -0,0 +1,79 @@
+from tasks.utils.traffic import aggregate_traffic, generate_traffic, iter_traffic
+
+
+TRAFFIC = """\
+     120    34567 ACCEPT     tcp  --  *      *       0.0.0.0/0            0.0.0.0/0            tcp dpt:1234 /* UPLOAD 1234->1.1.1.1 */
+      80    12345 ACCEPT     tcp  --  *      *       0.0.0.0/0            0.0.0.0/0            tcp spt:1234 /* DOWNLOAD 1234->1.1.1.1 */
+       3      300 ACCEPT     udp  --  *      *       0.0.0.0/0            0.0.0.0/0            udp dpt:1234 /* UPLOAD-UDP 1234->1.1.1.1 */
+       1      100 DNAT       tcp  --  *      *       0.0.0.0/0            0.0.0.0/0            tcp dpt:4321 /* FORWARD 4321->2.2.2.2:80 */
+       7      700 ACCEPT     tcp  --  *      *       ::/0                 ::/0                 tcp spt:4321 /* DOWNLOAD 4321->[::1]:80 */"""
+
+
+def test_iter_traffic():
+    assert list(iter_traffic(TRAFFIC)) == [
+        (1234, "upload", 34567),
+        (1234, "download", 12345),
+        (1234, "upload", 300),
+        (4321, "download", 700),
+    ]
+
+
+def test_iter_traffic_stream():
+    assert list(iter_traffic(TRAFFIC.split("\n"))) == list(
+        iter_traffic(TRAFFIC)
+    )
+
+
+def test_aggregate_traffic():
+    assert aggregate_traffic(TRAFFIC) == {
+        1234: {"download": 12345, "upload": 34867},
+        4321: {"download": 700, "upload": 0},
+    }
+
+
+COUNTERS = """\
+add aurora-up 1234 packets 5 bytes 300
+add aurora-down 1234 packets 4 bytes 200
+add aurora-fwd-up4 1.1.1.1,tcp:80 packets 7 bytes 700 comment "4321"
+add aurora-fwd-up4 1.1.1.1,udp:80 packets 1 bytes 100 comment "4321"
+add aurora-fwd-down6 ::1,tcp:80 packets 2 bytes 50 comment "4321"
+"""
+
+
+def test_iter_traffic_counters():
+    assert list(iter_traffic(COUNTERS)) == [
+        (1234, "upload", 300),
+        (1234, "download", 200),
+        (4321, "upload", 700),
+        (4321, "upload", 100),
+        (4321, "download", 50),
+    ]
+
+
+NFT_COUNTERS = (
+    '{"nftables": [{"metainfo": {"version": "1.0.6", "json_schema_version": 1}}'
+    ', {"counter": {"family": "inet", "name": "up_1234", "table": "aurora", '
+    '"handle": 5, "packets": 5, "bytes": 300}}, {"counter": {"family": "inet"'
+    ', "name": "down_1234", "table": "aurora", "handle": 6, "packets": 4, '
+    '"bytes": 200}}, {"counter": {"family": "inet", "name": "up_22", '
+    '"table": "filter", "handle": 2, "packets": 1, "bytes": 60}}]}\n'
+    '{"nftables": [{"counter": {"family": "inet", "name": "down_4321", '
+    '"table": "aurora", "handle": 9, "packets": 2, "bytes": 50}}]}\n'
+)
+
+
+def test_iter_traffic_nft_counters():
+    assert list(iter_traffic(NFT_COUNTERS)) == [
+        (1234, "upload", 300),
+        (1234, "download", 200),
+        (4321, "download", 50),
+    ]
+
+
+def test_aggregate_generated_traffic():
+    traffics = aggregate_traffic(generate_traffic(10000))
+    assert len(traffics) == 2500
+    assert traffics[10000] == {
+        "download": 1031 + 3 * 1031,
+        "upload": 2 * 1031,
+    }
@@ -0,0 +1,119 @@
+import pytest
+
+from app.db.models.port import Port, PortUsage
+from app.db.models.server import Server
+from tasks.config import huey
+from tasks.utils import usage
+from tasks.utils.usage import (
+    get_traffic_counters,
+    set_traffic_counters,
+    update_usages,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+FIELDS = {"download", "upload", "download_accumulate", "upload_accumulate"}
+
+
+@pytest.fixture
+def increased(monkeypatch):
+    """
+    Port usages added by update_usages, keyed by port id.
+    """
+    monkeypatch.setattr(huey.storage, "conn", fakeredis.FakeRedis())
+    added = {}
+    monkeypatch.setattr(
+        usage,
+        "increase_port_usages",
+        lambda db, port_usages, sample_ts=None: added.update(
+            (u.port_id, u.dict(include=FIELDS)) for u in port_usages
+        ),
+    )
+    return added
+
+
+def make_server(**usage):
+    port = Port(id=10, num=1000, usage=PortUsage(**usage) if usage else None)
+    return Server(id=1, ports=[port])
+
+
+def sweep(server, accumulate=False, **traffic):
+    update_usages(None, server, {1000: traffic}, accumulate=accumulate)
+    return dict(get_traffic_counters(server.id)[1000])
+
+
+def test_deltas_from_the_last_counters(increased):
+    server = make_server()
+    set_traffic_counters(1, {1000: {"download": 100, "upload": 10}})
+    assert sweep(server, download=150, upload=10) == {
+        "download": 150,
+        "upload": 10,
+    }
+    assert increased == {
+        10: {
+            "download": 50,
+            "upload": 0,
+            "download_accumulate": 0,
+            "upload_accumulate": 0,
+        }
+    }
+
+
+def test_counter_reset(increased):
+    server = make_server()
+    set_traffic_counters(1, {1000: {"download": 100, "upload": 10}})
+    # The host rebooted, what it counted since is all new traffic
+    assert sweep(server, download=30, upload=20) == {
+        "download": 30,
+        "upload": 20,
+    }
+    assert increased[10] == {
+        "download": 30,
+        "upload": 10,
+        "download_accumulate": 100,
+        "upload_accumulate": 0,
+    }
+
+
+def test_accumulate_resets_counters(increased):
+    server = make_server()
+    set_traffic_counters(1, {1000: {"download": 100, "upload": 10}})
+    assert sweep(server, accumulate=True, download=150, upload=10) == {
+        "download": 0,
+        "upload": 0,
+    }
+    assert increased[10] == {
+        "download": 50,
+        "upload": 0,
+        "download_accumulate": 150,
+        "upload_accumulate": 10,
+    }
+
+
+def test_missing_counters_fall_back_to_usage(increased):
+    # Redis lost the counters, the usage since the last reset is 200 - 80
+    server = make_server(
+        download=200, upload=50, download_accumulate=80, upload_accumulate=0
+    )
+    assert sweep(server, download=150, upload=50) == {
+        "download": 150,
+        "upload": 50,
+    }
+    assert increased[10] == {
+        "download": 30,
+        "upload": 0,
+        "download_accumulate": 0,
+        "upload_accumulate": 0,
+    }
+
+
+def test_missing_counters_without_usage(increased):
+    assert sweep(make_server(), download=150) == {"download": 150, "upload": 0}
+    assert increased[10]["download"] == 150
+
+
+def test_unknown_ports_are_skipped(increased):
+    server = make_server()
+    update_usages(None, server, {2000: {"download": 10}})
+    assert increased == {}
+    assert not huey.storage.conn.exists("aurora:traffic:1")
@@ -0,0 +1,184 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql.base import PGCompiler
+from sqlalchemy.dialects.sqlite.base import SQLiteCompiler
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v2 import ports
+from app.core.config import (
+    USAGE_SAMPLE_RETENTION_DAYS,
+    USAGE_HOURLY_RETENTION_DAYS,
+)
+from app.db.constants import UsageResolutionEnum
+from app.db.models.base import Base
+from app.db.models.port import (
+    Port,
+    PortUsageDaily,
+    PortUsageHourly,
+    PortUsageSample,
+)
+from app.db.models.server import Server
+from app.db.models.user import User
+from app.db.crud.port_usage import (
+    prune_port_usage_history,
+    rollup_port_usage_history,
+)
+
+DAY = datetime(2021, 3, 1)
+
+
+def date_trunc(unit, ts):
+    ts = datetime.fromisoformat(ts)
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    if unit == "day":
+        ts = ts.replace(hour=0)
+    return ts.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """
+    SQLite speaks the same ON CONFLICT DO UPDATE as postgres, render the
+    upserts with the postgres compiler and provide date_trunc.
+    """
+    for name in ("_on_conflict_target", "visit_on_conflict_do_update"):
+        monkeypatch.setattr(
+            SQLiteCompiler, name, getattr(PGCompiler, name), raising=False
+        )
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def connect(conn, record):
+        conn.create_function("date_trunc", 2, date_trunc)
+
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    server = Server(
+        name="server",
+        address="10.0.0.1",
+        ansible_name="server",
+        ansible_host="10.0.0.1",
+        config={},
+    )
+    db.add(server)
+    db.flush()
+    db.add(Port(num=1000, server_id=server.id, config={}))
+    db.commit()
+    yield db
+    db.close()
+
+
+def add_samples(db, *samples):
+    db.add_all(
+        PortUsageSample(port_id=1, bucket_ts=ts, download=down, upload=up)
+        for ts, down, up in samples
+    )
+    db.commit()
+
+
+def buckets(db, model):
+    return [
+        (row.bucket_ts, row.download, row.upload)
+        for row in db.query(model).order_by(model.bucket_ts)
+    ]
+
+
+def test_rollup_port_usage_history(db):
+    add_samples(
+        db,
+        (DAY.replace(hour=10), 1, 2),
+        (DAY.replace(hour=10, minute=50), 3, 4),
+        (DAY.replace(hour=11, minute=10), 5, 6),
+    )
+    rollup_port_usage_history(
+        db, UsageResolutionEnum.MINUTE_10, UsageResolutionEnum.HOUR, DAY
+    )
+    assert buckets(db, PortUsageHourly) == [
+        (DAY.replace(hour=10), 4, 6),
+        (DAY.replace(hour=11), 5, 6),
+    ]
+
+    # Buckets are recomputed, not added to, when a rollup runs again
+    add_samples(db, (DAY.replace(hour=11, minute=20), 10, 10))
+    rollup_port_usage_history(
+        db,
+        UsageResolutionEnum.MINUTE_10,
+        UsageResolutionEnum.HOUR,
+        DAY.replace(hour=11),
+    )
+    rollup_port_usage_history(
+        db, UsageResolutionEnum.HOUR, UsageResolutionEnum.DAY, DAY
+    )
+    assert buckets(db, PortUsageHourly) == [
+        (DAY.replace(hour=10), 4, 6),
+        (DAY.replace(hour=11), 15, 16),
+    ]
+    assert buckets(db, PortUsageDaily) == [(DAY, 19, 22)]
+
+
+def test_prune_port_usage_history(db):
+    add_samples(db, (DAY, 1, 1), (DAY + timedelta(days=1), 2, 2))
+    assert (
+        prune_port_usage_history(
+            db, UsageResolutionEnum.MINUTE_10, DAY + timedelta(hours=1)
+        )
+        == 1
+    )
+    assert buckets(db, PortUsageSample) == [(DAY + timedelta(days=1), 2, 2)]
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """
+    Call the endpoint directly and record the range it queries.
+    """
+    queried = []
+    monkeypatch.setattr(
+        ports, "get_port", lambda db, server_id, port_id: Port(id=port_id)
+    )
+    monkeypatch.setattr(
+        ports,
+        "get_port_usage_history",
+        lambda db, port_id, *args: queried.append(args) or [],
+    )
+
+    def get(start=None, end=None):
+        ports.port_usage_history(
+            Response(),
+            1,
+            1,
+            start=start,
+            end=end,
+            db=None,
+            user=User(is_superuser=True),
+        )
+        return queried.pop()
+
+    return get
+
+
+def test_usage_history_resolution(history):
+    now = datetime.utcnow()
+    resolution, start, end = history()
+    assert resolution == UsageResolutionEnum.MINUTE_10
+    assert end - start == timedelta(days=1)
+
+    # Aware timestamps are compared and queried as naive UTC
+    aware = (now - timedelta(hours=3)).replace(tzinfo=timezone.utc)
+    resolution, start, end = history(
+        start=aware.astimezone(timezone(timedelta(hours=8)))
+    )
+    assert resolution == UsageResolutionEnum.MINUTE_10
+    assert start == aware.replace(tzinfo=None)
+    assert end.tzinfo is None
+
+    # A short range is served from what is still kept at its start
+    old = now - timedelta(days=USAGE_SAMPLE_RETENTION_DAYS + 1)
+    resolution, *_ = history(start=old, end=old + timedelta(hours=1))
+    assert resolution == UsageResolutionEnum.HOUR
+
+    old = now - timedelta(days=USAGE_HOURLY_RETENTION_DAYS + 1)
+    resolution, *_ = history(start=old, end=old + timedelta(hours=1))
+    assert resolution == UsageResolutionEnum.DAY
@@ -0,0 +1,110 @@
+"""
+Load benchmark of the API concurrency model: concurrent requests whose
+handler does blocking (sync SQLAlchemy like) work, either on the event
+loop as the former `async def` handlers did, or in the bounded thread
+pool as `def` handlers do now.
+
+    python -m app.utils.bench [requests] [query_ms]
+    python -m app.utils.bench http://host:8888/api/v1/servers TOKEN [requests]
+"""
+import sys
+import time
+import typing as t
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import config
+
+
+def build_app(query_seconds: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/loop")
+    async def on_loop():
+        time.sleep(query_seconds)
+        return {}
+
+    @app.get("/threadpool")
+    def in_threadpool():
+        time.sleep(query_seconds)
+        return {}
+
+    return app
+
+
+async def measure(
+    client: httpx.AsyncClient, url: str, requests: int
+) -> t.List[float]:
+    """
+    Latencies of requests all arriving at once, measured from the arrival
+    so time spent queued behind a blocked loop is counted.
+    """
+    latencies = []
+    started = time.perf_counter()
+
+    async def request():
+        (await client.get(url)).raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(request() for _ in range(requests)))
+    return latencies
+
+
+def percentile(latencies: t.List[float], pct: int) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, len(latencies) * pct // 100)]
+
+
+def report(name: str, latencies: t.List[float]) -> None:
+    print(
+        f"{name}: {len(latencies)} requests, "
+        f"p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+        f"p99 {percentile(latencies, 99) * 1000:.0f} ms"
+    )
+
+
+async def bench_handlers(requests: int, query_seconds: float) -> None:
+    app = build_app(query_seconds)
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        report(
+            "before, sync work on the event loop",
+            await measure(client, "/loop", requests),
+        )
+        report(
+            "after, sync work in the thread pool",
+            await measure(client, "/threadpool", requests),
+        )
+
+
+async def bench_url(url: str, token: str, requests: int) -> None:
+    async with httpx.AsyncClient(
+        headers={"Authorization": f"Bearer {token}"}, timeout=None
+    ) as client:
+        report(url, await measure(client, url, requests))
+
+
+if __name__ == "__main__":
+    loop = asyncio.get_event_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(
+            max_workers=config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW
+        )
+    )
+    if len(sys.argv) > 2 and sys.argv[1].startswith("http"):
+        loop.run_until_complete(
+            bench_url(
+                sys.argv[1],
+                sys.argv[2],
+                int(sys.argv[3]) if len(sys.argv) > 3 else 100,
+            )
+        )
+    else:
+        loop.run_until_complete(
+            bench_handlers(
+                int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+                (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000,
+            )
+        )
@@ -0,0 +1,95 @@
+import json
+import base64
+import typing as t
+from fastapi import HTTPException
+from fastapi_pagination import Page
+from fastapi_pagination.api import resolve_params
+from fastapi_pagination.bases import AbstractParams
+from pydantic import conint
+from sqlalchemy import and_, inspect, or_
+from sqlalchemy.orm import Query
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+
+T = t.TypeVar("T")
+
+
+class CursorPage(Page[T], t.Generic[T]):
+    # Null on pages read by cursor, the offset is unknown then
+    page: t.Optional[conint(ge=0)] = None
+    # Pass as ?cursor= to read the next page by key instead of by offset
+    next_cursor: t.Optional[str] = None
+
+    @classmethod
+    def create(
+        cls,
+        items: t.Sequence[T],
+        total: int,
+        params: AbstractParams,
+        next_cursor: str = None,
+        by_cursor: bool = False,
+    ) -> "CursorPage[T]":
+        page = super().create(items, total, params)
+        page.next_cursor = next_cursor
+        if by_cursor:
+            page.page = None
+        return page
+
+
+def encode_cursor(value: t.Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> t.Any:
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        value = None
+    if not isinstance(value, list) or len(value) != 2:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+
+def paginate_query(
+    query: Query,
+    key: InstrumentedAttribute,
+    *,
+    options: t.Sequence = (),
+    cursor: str = None,
+    params: AbstractParams = None,
+) -> CursorPage:
+    """
+    Count and slice query in SQL ordered by key, loader options only apply
+    to the rows of the page. A cursor (the key of the last row of the
+    previous page) replaces the OFFSET, so deep pages cost the same as the
+    first one. key only needs to be unique within the query's rows, ties
+    are broken by the primary key which the cursor carries too.
+    """
+    params = resolve_params(params)
+    if cursor is not None and params.page:
+        raise HTTPException(
+            status_code=400, detail="Pass either a cursor or a page"
+        )
+    limit_offset = params.to_limit_offset()
+    mapper = inspect(key.class_)
+    primary_key = mapper.primary_key[0]
+    total = query.order_by(None).count()
+    page_query = query.options(*options).order_by(key, primary_key)
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor)
+        page_query = page_query.filter(
+            or_(key > value, and_(key == value, primary_key > last_id))
+        )
+    else:
+        page_query = page_query.offset(limit_offset.offset)
+    items = page_query.limit(limit_offset.limit).all()
+    next_cursor = None
+    if len(items) == limit_offset.limit:
+        next_cursor = encode_cursor(
+            [
+                getattr(items[-1], key.key),
+                mapper.primary_key_from_instance(items[-1])[0],
+            ]
+        )
+    return CursorPage.create(
+        items, total, params, next_cursor, by_cursor=cursor is not None
+    )
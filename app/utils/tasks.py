@@ -5,27 +5,19 @@ from app.db.models.server import Server
 from app.db.models.port_forward import PortForwardRule, MethodEnum
 from app.db.schemas.server import ServerEdit
 
-from tasks.ansible import ansible_hosts_runner
-from tasks.app import rule_runner
-from tasks.clean import clean_runner
-from tasks.clean import clean_port_runner
-from tasks.iptables import iptables_runner, iptables_reset_runner
-from tasks.tc import tc_runner
-from tasks.server import server_runner, connect_runner
+from tasks.queue import enqueue_server_task, send_task
+from tasks.utils.iptables import get_iptables_op
 
 
 def send_iptables(rule: PortForwardRule):
-    kwargs = {
-        "port_id": rule.port.id,
-        "server_id": rule.port.server.id,
-        "local_port": rule.port.num,
-        "update_status": True,
-        "remote_address": rule.config.get("remote_address"),
-        "remote_port": rule.config.get("remote_port"),
-        "forward_type": rule.config.get("type", "ALL").upper(),
-    }
-    print(f"Sending iptables_runner task, kwargs: {kwargs}")
-    iptables_runner(**kwargs)
+    kwargs = get_iptables_op(rule)
+    print(f"Queueing iptables task, kwargs: {kwargs}")
+    enqueue_server_task(rule.port.server.id, "iptables", **kwargs)
+
+
+def trigger_iptables_sync(server_id: int):
+    print("Sending iptables.iptables_sync_runner task")
+    send_task("tasks.iptables.iptables_sync_runner", server_id, priority=4)
 
 
 def trigger_forward_rule(rule: PortForwardRule):
@@ -46,7 +38,7 @@ def trigger_forward_rule(rule: PortForwardRule):
         MethodEnum.REALM,
         MethodEnum.HAPROXY,
     ):
-        rule_runner(rule_id=rule.id)
+        enqueue_server_task(rule.port.server.id, "rule", rule_id=rule.id)
     elif rule.method == MethodEnum.IPTABLES:
         send_iptables(rule)
     else:
@@ -55,33 +47,25 @@ def trigger_forward_rule(rule: PortForwardRule):
 
 def trigger_tc(port: Port):
     kwargs = {
-        "server_id": port.server.id,
         "port_num": port.num,
         "egress_limit": port.config.get("egress_limit"),
         "ingress_limit": port.config.get("ingress_limit"),
     }
-    print(f"Sending tc_runner task, kwargs: {kwargs}")
-    tc_runner(**kwargs)
+    print(f"Queueing tc task, kwargs: {kwargs}")
+    enqueue_server_task(port.server.id, "tc", **kwargs)
 
 
 def remove_tc(server_id: int, port_num: int):
     kwargs = {
-        "server_id": server_id,
         "port_num": port_num,
     }
-    print(f"Sending tc_runner task, kwargs: {kwargs}")
-    tc_runner(**kwargs)
-
-
-def trigger_ansible_hosts():
-    print("Sending ansible_hosts_runner task")
-    ansible_hosts_runner()
+    print(f"Queueing tc task, kwargs: {kwargs}")
+    enqueue_server_task(server_id, "tc", **kwargs)
 
 
 def trigger_iptables_reset(port: Port):
-    kwargs = {"server_id": port.server.id, "port_num": port.num}
-    print("Sending iptables.iptables_reset_runner task")
-    iptables_reset_runner(**kwargs)
+    print("Queueing iptables_reset task")
+    enqueue_server_task(port.server.id, "iptables_reset", port_num=port.num)
 
 
 def trigger_server_init(server_id: int, init: bool = False, **kwargs):
@@ -89,22 +73,28 @@ def trigger_server_init(server_id: int, init: bool = False, **kwargs):
     kwargs["sync_scripts"] = init
     kwargs["init_iptables"] = init
     print("Sending server.server_runner task")
-    server_runner(**kwargs)
+    send_task("tasks.server.server_runner", priority=3, **kwargs)
 
 
 def trigger_server_connect(server_id: int, **kwargs):
     kwargs["server_id"] = server_id
     print("Sending server.connect_runner task")
-    connect_runner(**kwargs)
+    send_task("tasks.server.connect_runner", priority=3, **kwargs)
 
 
 def trigger_server_clean(server: Server):
     print("Sending clean.clean_runner task")
-    clean_runner(server=ServerEdit(**server.__dict__).dict())
+    send_task(
+        "tasks.clean.clean_runner", server=ServerEdit(**server.__dict__).dict()
+    )
 
 
 def trigger_port_clean(server: Server, port: Port, update_traffic: bool = True):
-    print("Sending clean.clean_port_runner task")
-    clean_port_runner(
-        server_id=server.id, port=port, update_traffic=update_traffic
+    print("Queueing clean_port task")
+    enqueue_server_task(
+        server.id,
+        "clean_port",
+        port_id=port.id,
+        port_num=port.num,
+        update_traffic=update_traffic,
     )
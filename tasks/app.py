@@ -1,18 +1,26 @@
 import traceback
 import typing as t
+from collections import defaultdict
 from uuid import uuid4
 from datetime import datetime, timedelta
 
 from app.db.session import db_session
 from app.db.crud.server import get_server_with_ports_usage
 from app.db.crud.port import get_port_by_id
+from app.db.models.port_forward import PortForwardRule
 from app.db.crud.port_forward import get_forward_rule_by_id
 
 from .config import huey
+from tasks.queue import server_queue_handler
 from tasks.clean import clean_port_runner
 from tasks.functions import AppConfig
 from tasks.utils.runner import run
-from tasks.utils.handlers import iptables_finished_handler, status_handler
+from tasks.utils.handlers import (
+    app_batch_finished_handler,
+    iptables_finished_handler,
+    status_handler,
+    update_rule_digest,
+)
 
 
 @huey.task(priority=4)
@@ -53,11 +61,8 @@ def app_runner(
         "update_app": update_status and not server.config.get(app_name),
     }
     if app_config is not None:
-        with open(
-            f"ansible/project/roles/app/files/{app_name}-{port_id}", "w"
-        ) as f:
-            f.write(app_config)
         extravars["app_config"] = f"{app_name}-{port_id}"
+        extravars["app_config_content"] = app_config
 
     run(
         server=server,
@@ -71,6 +76,19 @@ def app_runner(
     )
 
 
+def is_rule_deployed(rule: PortForwardRule, digest: str) -> bool:
+    """
+    The host last reported running exactly what was last deployed with the
+    same digest, reverse proxied rules always go through.
+    """
+    return (
+        not rule.config.get("reverse_proxy")
+        and rule.status == "successful"
+        and rule.config.get("digest") == digest
+        and rule.config.get("reported_digest") == digest
+    )
+
+
 @huey.task(priority=4)
 def rule_runner(rule_id: int):
     try:
@@ -83,27 +101,38 @@ def rule_runner(rule_id: int):
                 rule.port.server.id,
             )
             ident = uuid4()
+            # Playbooks and extravars to run, copied out of the shared
+            # AppConfig instances as the next apply overwrites them
             app_configs = []
             if rule.config.get("reverse_proxy"):
                 reverse_proxy_port = get_port_by_id(
                     db, rule.config.get("reverse_proxy")
                 )
+                reverse_proxy_config = AppConfig.configs[
+                    reverse_proxy_port.forward_rule.method
+                ].apply(db, reverse_proxy_port)
                 app_configs.append(
-                    AppConfig.configs[
-                        reverse_proxy_port.forward_rule.method
-                    ].apply(db, reverse_proxy_port)
+                    (
+                        reverse_proxy_config.playbook,
+                        dict(reverse_proxy_config.extravars),
+                    )
                 )
+            config = AppConfig.configs[rule.method].apply(db, rule.port)
+            digest = config.get_digest(rule.port)
             app_configs.append(
-                AppConfig.configs[rule.method].apply(db, rule.port)
+                (config.playbook, dict(config.extravars, app_digest=digest))
             )
             db.refresh(rule)
+            if is_rule_deployed(rule, digest):
+                print(f"Rule {rule_id} is unchanged on the host, skipping")
+                return
             server = get_server_with_ports_usage(db, server_id)
 
-        for config in app_configs:
+        for playbook, extravars in app_configs:
             runner = run(
                 server,
-                config.playbook,
-                extravars=config.extravars,
+                playbook,
+                extravars=extravars,
                 ident=ident,
                 status_handler=lambda s, **k: status_handler(port_id, s, True),
                 finished_callback=iptables_finished_handler(
@@ -112,9 +141,87 @@ def rule_runner(rule_id: int):
             )
             if runner.status != "successful":
                 break
+        else:
+            update_rule_digest(server_id, port_id, digest)
     except Exception:
         with db_session() as db:
             rule.status = "failed"
             rule.config["error"] = traceback.format_exc()
             db.add(rule)
             db.commit()
+
+
+def run_rule_batch(server_id: int, rule_ids: t.List[int]) -> t.List[int]:
+    """
+    Deploy rules of batchable app configs in one app_batch.yml run,
+    returns ids of the rules left for rule_runner.
+    """
+    rest = []
+    rules_by_method = defaultdict(list)
+    with db_session() as db:
+        for rule_id in rule_ids:
+            rule = get_forward_rule_by_id(db, rule_id)
+            config = AppConfig.configs.get(rule.method)
+            if (
+                config is None
+                or not config.batchable
+                or rule.config.get("reverse_proxy")
+            ):
+                rest.append(rule_id)
+            else:
+                rules_by_method[rule.method].append(rule)
+        deployments = []
+        for method, rules in rules_by_method.items():
+            try:
+                for rule, deployment in zip(
+                    rules,
+                    AppConfig.configs[method].apply_all(
+                        db, [rule.port for rule in rules]
+                    ),
+                ):
+                    if is_rule_deployed(rule, deployment["app_digest"]):
+                        print(f"Rule {rule.id} is unchanged, skipping")
+                    else:
+                        deployments.append(deployment)
+            except Exception:
+                traceback.print_exc()
+                rest.extend(rule.id for rule in rules)
+        server = get_server_with_ports_usage(db, server_id)
+    if not deployments:
+        return rest
+
+    port_ids = {d["local_port"]: d["port_id"] for d in deployments}
+
+    def update_status(status_data, **kwargs):
+        for port_id in port_ids.values():
+            status_handler(port_id, status_data, True)
+        return status_data
+
+    run(
+        server=server,
+        playbook="app_batch.yml",
+        extravars={
+            "deployments": deployments,
+            "apps": list(
+                {
+                    d["app_name"]: d for d in deployments if d["update_app"]
+                }.values()
+            ),
+        },
+        status_handler=update_status,
+        finished_callback=app_batch_finished_handler(
+            server.id,
+            port_ids,
+            {d["port_id"]: d["app_digest"] for d in deployments},
+        ),
+    )
+    return rest
+
+
+@server_queue_handler("rule", key=lambda op: op["rule_id"])
+def run_rules(server_id: int, ops: t.List[t.Dict]):
+    rule_ids = [op["rule_id"] for op in ops]
+    if len(rule_ids) > 1:
+        rule_ids = run_rule_batch(server_id, rule_ids)
+    for rule_id in rule_ids:
+        rule_runner.call_local(rule_id=rule_id)
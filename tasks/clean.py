@@ -8,38 +8,58 @@ from app.db.crud.server import get_server_with_ports_usage
 from app.db.crud.port_forward import get_forward_rule, get_all_expire_rules
 from app.db.models.port import Port
 from .config import huey
-from tasks.ansible import ansible_hosts_runner
+from tasks.queue import enqueue_server_task, server_queue_handler
 from tasks.utils.runner import run
 from tasks.utils.handlers import iptables_finished_handler
 
 
-def clean_finished_handler(runner):
-    ansible_hosts_runner()
-
-
 @huey.task()
 def clean_runner(server: t.Dict):
     run(
         server=server,
         playbook="clean.yml",
-        finished_callback=clean_finished_handler,
     )
 
 
-@huey.task(priority=4)
-def clean_port_runner(server_id: int, port: Port, update_traffic: bool = True):
+@server_queue_handler("clean_port", key=lambda op: op["port_num"])
+def run_clean_ports(server_id: int, ops: t.List[t.Dict]):
     with db_session() as db:
-        if db_forward_rule := get_forward_rule(db, server_id, port.id):
-            db.delete(db_forward_rule)
-            db.commit()
+        for op in ops:
+            if op.get("port_id") is None:
+                continue
+            if db_rule := get_forward_rule(db, server_id, op["port_id"]):
+                db.delete(db_rule)
+        db.commit()
         server = get_server_with_ports_usage(db, server_id)
-    run(
-        server=server,
-        playbook="clean_port.yml",
-        extravars={"local_port": port.num},
-        finished_callback=iptables_finished_handler(
-            server.id, accumulate=True, update_traffic_bool=update_traffic
-        ),
+    for update_traffic in (True, False):
+        local_ports = [
+            op["port_num"]
+            for op in ops
+            if op.get("update_traffic", True) == update_traffic
+        ]
+        if not local_ports:
+            continue
+        run(
+            server=server,
+            playbook="clean_port.yml",
+            extravars={"local_ports": local_ports},
+            finished_callback=iptables_finished_handler(
+                server.id, accumulate=True, update_traffic_bool=update_traffic
+            ),
+        )
+
+
+@huey.task(priority=4)
+def clean_port_runner(server_id: int, port: Port, update_traffic: bool = True):
+    run_clean_ports(
+        server_id,
+        [
+            {
+                "port_id": port.id,
+                "port_num": port.num,
+                "update_traffic": update_traffic,
+            }
+        ],
     )
 
 
@@ -49,8 +69,10 @@ def clean_expired_port_runner():
         db_expire_rules = get_all_expire_rules(db)
     for db_rule in db_expire_rules:
         if time.time() > db_rule.config.get("expire_time", float("inf")):
-            clean_port_runner(
+            enqueue_server_task(
                 db_rule.port.server.id,
-                db_rule.port,
+                "clean_port",
+                port_id=db_rule.port.id,
+                port_num=db_rule.port.num,
                 update_traffic=True,
             )
@@ -3,3 +3,10 @@ from huey import PriorityRedisHuey
 from app.core import config
 
 huey = PriorityRedisHuey("aurora", host=config.REDIS_HOST, port=config.REDIS_PORT)
+
+
+def server_lock(server_id: int):
+    """
+    Lock serializing ansible and ssh work on one server across workers.
+    """
+    return huey.lock_task(f"server-{server_id}")
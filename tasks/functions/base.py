@@ -1,9 +1,16 @@
 from __future__ import annotations
+import hashlib
+import typing as t
 from sqlalchemy.orm import Session
 
 from app.db.models.port import Port
 from app.db.models.port_forward import MethodEnum
 
+from tasks.utils.files import get_md5_for_file
+
+
+SERVICE_TEMPLATE = "ansible/project/files/template.service"
+
 
 class ConfigMount(type):
     def __init__(cls, name, bases, attrs):
@@ -26,6 +33,7 @@ class AppConfig(metaclass=ConfigMount):
 
     app_command: str
     app_config: str
+    app_config_content: str
 
     app_role_name: str
     app_download_role_name: str
@@ -59,6 +67,53 @@ class AppConfig(metaclass=ConfigMount):
     def apply(self, db: Session, port: Port) -> AppConfig:
         raise NotImplementedError
 
+    def set_app_config(self, name: str, content: str) -> None:
+        """
+        Config is passed inline as an extravar, nothing is written on the
+        worker so any consumer can run the playbook
+        """
+        self.app_config = name
+        self.app_config_content = content
+
+    def get_digest(self, port: Port) -> str:
+        """
+        Digest of everything an applied config deploys on the host: config
+        content, command, binary version of the server and service template.
+        """
+        if not self.applied:
+            raise ValueError("Config not applied")
+        hash_md5 = hashlib.md5()
+        for part in (
+            getattr(self, "app_command", None),
+            self.remote_ip,
+            port.server.config.get(self.app_name),
+            getattr(self, "app_config_content", None),
+            get_md5_for_file(SERVICE_TEMPLATE),
+        ):
+            hash_md5.update(f"\0{part}".encode())
+        return hash_md5.hexdigest()
+
+    def apply_all(self, db: Session, ports: t.List[Port]) -> t.List[t.Dict]:
+        """
+        Apply config to every port, returning one deployment per port for
+        app_batch.yml
+        """
+        deployments = []
+        for port in ports:
+            self.apply(db, port)
+            deployments.append(
+                dict(
+                    self.extravars,
+                    port_id=port.id,
+                    app_digest=self.get_digest(port),
+                )
+            )
+        return deployments
+
+    @property
+    def batchable(self) -> bool:
+        return self.playbook == "app.yml" and self.app_role_name == "app"
+
     @property
     def playbook(self):
         raise NotImplementedError
@@ -26,9 +26,7 @@ class CaddyConfig(AppConfig):
         self.local_port = port.num
 
         caddy_config = generate_caddy_config(port)
-        with open(f"ansible/project/roles/app/files/caddy-{port.id}", "w") as f:
-            f.write(caddy_config)
-        self.app_config = f"caddy-{port.id}"
+        self.set_app_config(f"caddy-{port.id}", caddy_config)
 
         self.update_app = not port.server.config.get("caddy")
         self.applied = True
@@ -30,10 +30,8 @@ class GostConfig(AppConfig):
         self.local_port = port.num
 
         config = GostConfig.generate_gost_config(port.forward_rule)
-        with open(f"ansible/project/roles/app/files/gost-{port.id}", "w") as f:
-            f.write(json.dumps(config, indent=2))
+        self.set_app_config(f"gost-{port.id}", json.dumps(config, indent=2))
         self.app_command = f"/usr/local/bin/gost -C /usr/local/etc/aurora/{port.num}"
-        self.app_config = f"gost-{port.id}"
         self.remote_ip = GostConfig.get_gost_remote_ip(config)
 
         self.update_app = not port.server.config.get("gost")
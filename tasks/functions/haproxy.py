@@ -26,14 +26,10 @@ class HaproxyConfig(AppConfig):
         self.local_port = port.num
 
         config = HaproxyConfig.generate_config(port.forward_rule)
-        with open(
-            f"ansible/project/roles/app/files/haproxy-{port.id}", "w"
-        ) as f:
-            f.write(config)
+        self.set_app_config(f"haproxy-{port.id}", config)
         self.app_command = (
             f"/usr/sbin/haproxy -f /usr/local/etc/aurora/{port.num}"
         )
-        self.app_config = f"haproxy-{port.id}"
 
         self.update_app = not port.server.config.get("haproxy")
         self.applied = True
@@ -27,8 +27,9 @@ class V2rayConfig(AppConfig):
         self.local_port = port.num
 
         v2ray_config = generate_v2ray_config(port.forward_rule)
-        with open(f"ansible/project/roles/app/files/v2ray-{port.id}", "w") as f:
-            f.write(json.dumps(v2ray_config, indent=2))
+        self.set_app_config(
+            f"v2ray-{port.id}", json.dumps(v2ray_config, indent=2)
+        )
         if not (core := port.forward_rule.config.get("core", "v2ray")):
             core = "v2ray"
         self.app_command = (
@@ -36,7 +37,6 @@ class V2rayConfig(AppConfig):
             f"{'-format=json' if core == 'xray' else ''} "
             f"-config /usr/local/etc/aurora/{port.num}"
         )
-        self.app_config = f"v2ray-{port.id}"
 
         self.update_app = not port.server.config.get("v2ray")
         self.applied = True
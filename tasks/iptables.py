@@ -1,4 +1,6 @@
 import traceback
+import typing as t
+from collections import defaultdict
 from huey import crontab
 
 from app.db.session import db_session
@@ -8,99 +10,199 @@ from app.db.crud.server import (
     get_server_with_ports_usage,
 )
 from app.db.crud.port import get_port
-from app.db.crud.port_forward import get_all_ddns_rules
+from app.db.crud.port_forward import (
+    get_all_ddns_rules,
+    get_all_iptables_rules,
+)
 from app.core.config import DDNS_INTERVAL_SECONDS
 from app.utils.dns import dns_query
 from app.utils.ip import is_ip
 
 from .config import huey
-from tasks.app import rule_runner
+from tasks.queue import (
+    enqueue_server_task,
+    enqueue_server_tasks,
+    server_queue_handler,
+)
 from tasks.utils.runner import run
 from tasks.utils.handlers import status_handler, iptables_finished_handler
+from tasks.utils.iptables import get_iptables_op
+from tasks.utils.usage import clear_traffic_counters
 
 
-@huey.task(priority=4)
-def iptables_runner(
+def get_iptables_spec(
     port_id: int,
     server_id: int,
     local_port: int,
     remote_address: str,
     remote_port: int = None,
     forward_type: str = None,
-    update_status: bool = False,
-):
-    try:
-        if not is_ip(remote_address):
-            remote_ip = dns_query(remote_address)
-        else:
-            remote_ip = remote_address
+    **kwargs,
+) -> t.List:
+    """
+    [local_port] to delete, [local_port, "LIST"] to list the traffic or
+    [local_port, forward_type, remote_ip, remote_port] to forward.
+    """
+    if not is_ip(remote_address):
+        remote_ip = dns_query(remote_address)
+    else:
+        remote_ip = remote_address
+    if not forward_type:
+        return [local_port]
+    if remote_port:
         with db_session() as db:
             port = get_port(db, server_id, port_id)
-            if not forward_type:
-                args = f" delete {local_port}"
-            elif remote_port:
-                port.forward_rule.config["remote_ip"] = remote_ip
-                db.add(port.forward_rule)
-                db.commit()
-                args = f" -t={forward_type} forward {local_port} {remote_ip} {remote_port}"
-            else:
-                args = f" list {local_port}"
-            server = get_server_with_ports_usage(db, server_id)
+            port.forward_rule.config["remote_ip"] = remote_ip
+            db.add(port.forward_rule)
+            db.commit()
+        return [local_port, forward_type, remote_ip, remote_port]
+    return [local_port, "LIST"]
+
+
+def get_iptables_args(spec: t.List) -> str:
+    local_port, *forward = spec
+    if not forward:
+        return f" delete {local_port}"
+    if forward == ["LIST"]:
+        return f" list {local_port}"
+    forward_type, remote_ip, remote_port = forward
+    return f" -t={forward_type} forward {local_port} {remote_ip} {remote_port}"
 
-        extravars = {
-            "host": server.ansible_name,
-            "local_port": local_port,
-            "iptables_args": args,
-        }
 
+def iptables_failed(server_id: int, port_id: int):
+    traceback.print_exc()
+    with db_session() as db:
+        port = get_port(db, server_id, port_id)
+        port.forward_rule.status = "failed"
+        port.forward_rule.config["error"] = traceback.format_exc()
+        print(port.forward_rule.__dict__)
+        db.add(port.forward_rule)
+        db.commit()
+
+
+@server_queue_handler("iptables", key=lambda op: op["port_id"])
+def run_iptables(server_id: int, ops: t.List[t.Dict]):
+    """
+    A single op runs its own forward/delete/list, several ops are applied
+    by one `restore` call of iptables.sh (iptables-restore or one nft
+    transaction) which also lists their counters beforehand.
+    """
+    specs = []
+    port_ids = []
+    for op in ops:
+        try:
+            specs.append(get_iptables_spec(server_id=server_id, **op))
+        except Exception:
+            iptables_failed(server_id, op["port_id"])
+            continue
+        if op.get("update_status"):
+            port_ids.append(op["port_id"])
+    if not specs:
+        return
+    if len(specs) == 1:
+        iptables_args_list = [get_iptables_args(specs[0])]
+    else:
+        iptables_args_list = [
+            " restore "
+            + " ".join(",".join(map(str, spec)) for spec in specs)
+        ]
+
+    def update_status(status_data, **kwargs):
+        for port_id in port_ids:
+            status_handler(port_id, status_data, True)
+        return status_data
+
+    try:
+        with db_session() as db:
+            server = get_server_with_ports_usage(db, server_id)
         run(
             server=server,
             playbook="iptables.yml",
-            extravars=extravars,
-            status_handler=lambda s, **k: status_handler(
-                port_id, s, update_status
-            ),
+            extravars={
+                "host": server.ansible_name,
+                "iptables_args_list": iptables_args_list,
+            },
+            status_handler=update_status,
             finished_callback=iptables_finished_handler(
-                server.id, port_id, True
+                server.id, port_ids[0] if len(port_ids) == 1 else None, True
             )
-            if update_status
+            if port_ids
             else lambda r: None,
         )
     except Exception:
-        traceback.print_exc()
-        with db_session() as db:
-            port = get_port(db, server_id, port_id)
-            port.forward_rule.status = "failed"
-            port.forward_rule.config["error"] = traceback.format_exc()
-            print(port.forward_rule.__dict__)
-            db.add(port.forward_rule)
-            db.commit()
+        for op in ops:
+            iptables_failed(server_id, op["port_id"])
 
 
 @huey.task(priority=4)
-def iptables_reset_runner(
+def iptables_runner(
+    port_id: int,
     server_id: int,
-    port_num: int,
+    local_port: int,
+    remote_address: str,
+    remote_port: int = None,
+    forward_type: str = None,
+    update_status: bool = False,
 ):
+    run_iptables(
+        server_id,
+        [
+            {
+                "port_id": port_id,
+                "local_port": local_port,
+                "remote_address": remote_address,
+                "remote_port": remote_port,
+                "forward_type": forward_type,
+                "update_status": update_status,
+            }
+        ],
+    )
+
+
+@huey.task(priority=4)
+def iptables_sync_runner(server_id: int):
+    """
+    Apply all iptables rules of a server, in one `restore` call.
+    """
     with db_session() as db:
-        server = get_server(db, server_id)
-    extravars = {
-        "host": server.ansible_name,
-        "local_port": port_num,
-        "iptables_args": f" reset {port_num}",
-    }
+        ops = [
+            get_iptables_op(rule)
+            for rule in get_all_iptables_rules(db, server_id)
+        ]
+    enqueue_server_tasks(server_id, "iptables", ops)
 
+
+@server_queue_handler("iptables_reset", key=lambda op: op["port_num"])
+def run_iptables_reset(server_id: int, ops: t.List[t.Dict]):
+    with db_session() as db:
+        server = get_server(db, server_id)
+    port_nums = [op["port_num"] for op in ops]
     run(
         server=server,
         playbook="iptables.yml",
-        extravars=extravars,
+        extravars={
+            "host": server.ansible_name,
+            "iptables_args_list": [
+                f" reset {port_num}" for port_num in port_nums
+            ],
+        },
     )
+    clear_traffic_counters(server.id, port_nums)
+
+
+@huey.task(priority=4)
+def iptables_reset_runner(
+    server_id: int,
+    port_num: int,
+):
+    run_iptables_reset(server_id, [{"port_num": port_num}])
 
 
 @huey.periodic_task(crontab(minute=f"*/{int(DDNS_INTERVAL_SECONDS)//60}"))
 def ddns_runner():
     with db_session() as db:
         rules = get_all_ddns_rules(db)
+    iptables_ops = defaultdict(list)
     for rule in rules:
         if (
             rule.config.get("remote_address")
@@ -114,14 +216,12 @@ def ddns_runner():
                     + f"{rule.config['remote_ip']}->{updated_ip}"
                 )
                 if rule.method == MethodEnum.IPTABLES:
-                    iptables_runner(
-                        rule.port.id,
-                        rule.port.server.id,
-                        rule.port.num,
-                        remote_address=updated_ip,
-                        remote_port=rule.config["remote_port"],
-                        forward_type=rule.config.get("type", "ALL"),
-                        update_status=True,
+                    iptables_ops[rule.port.server.id].append(
+                        dict(get_iptables_op(rule), remote_address=updated_ip)
                     )
                 else:
-                    rule_runner(rule_id=rule.id)
+                    enqueue_server_task(
+                        rule.port.server.id, "rule", rule_id=rule.id
+                    )
+    for server_id, ops in iptables_ops.items():
+        enqueue_server_tasks(server_id, "iptables", ops)
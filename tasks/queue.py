@@ -0,0 +1,104 @@
+import json
+import traceback
+import typing as t
+from uuid import uuid4
+from itertools import groupby
+
+from huey.exceptions import TaskLockedException
+from huey.registry import Message
+
+from .config import huey, server_lock
+
+
+SERVER_QUEUE_KEY = "aurora:queue:{server_id}"
+# kind -> (handler(server_id, ops), key of an op, later ops of a key win)
+SERVER_QUEUE_HANDLERS: t.Dict[
+    str, t.Tuple[t.Callable[[int, t.List[t.Dict]], None], t.Callable]
+] = {}
+
+
+def server_queue_handler(kind: str, key: t.Callable[[t.Dict], t.Hashable]):
+    def wrapper(func):
+        SERVER_QUEUE_HANDLERS[kind] = (func, key)
+        return func
+
+    return wrapper
+
+
+def send_task(name: str, *args, priority: int = None, **kwargs):
+    """
+    Enqueue a task by its registered name, e.g. "tasks.server.server_runner",
+    so the API does not have to import the worker modules defining it.
+    """
+    message = Message(str(uuid4()), name, None, 0, 0, priority, args, kwargs)
+    huey.storage.enqueue(huey.serializer.serialize(message), priority)
+
+
+def enqueue_server_task(server_id: int, kind: str, **kwargs):
+    enqueue_server_tasks(server_id, kind, [kwargs])
+
+
+def enqueue_server_tasks(server_id: int, kind: str, ops: t.List[t.Dict]):
+    """
+    Push several ops at once, so that they are drained as one batch.
+    """
+    if not ops:
+        return
+    huey.storage.conn.rpush(
+        SERVER_QUEUE_KEY.format(server_id=server_id),
+        *(json.dumps({"kind": kind, "kwargs": kwargs}) for kwargs in ops),
+    )
+    server_queue_runner(server_id)
+
+
+def drain_server_queue(server_id: int) -> t.List[t.Dict]:
+    key = SERVER_QUEUE_KEY.format(server_id=server_id)
+    with huey.storage.conn.pipeline() as pipe:
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        ops, _ = pipe.execute()
+    return [json.loads(op) for op in ops]
+
+
+def coalesce_server_ops(
+    ops: t.List[t.Dict],
+) -> t.List[t.Tuple[str, t.List[t.Dict]]]:
+    """
+    Merge adjacent ops of the same kind into one batch, keeping only the
+    last op for each key, order between different kinds is preserved.
+    """
+    batches = []
+    for kind, group in groupby(ops, key=lambda op: op["kind"]):
+        _, key = SERVER_QUEUE_HANDLERS[kind]
+        merged = {}
+        for op in group:
+            merged.pop(key(op["kwargs"]), None)
+            merged[key(op["kwargs"])] = op["kwargs"]
+        batches.append((kind, list(merged.values())))
+    return batches
+
+
+@huey.task(priority=4)
+def server_queue_runner(server_id: int):
+    try:
+        with server_lock(server_id):
+            while ops := drain_server_queue(server_id):
+                for kind, batch in coalesce_server_ops(ops):
+                    print(f"Running {len(batch)} {kind} ops on {server_id}")
+                    try:
+                        SERVER_QUEUE_HANDLERS[kind][0](server_id, batch)
+                    except Exception:
+                        traceback.print_exc()
+    except TaskLockedException:
+        # Whoever holds the lock calls kick_server_queue on release
+        return
+    kick_server_queue(server_id)
+
+
+def kick_server_queue(server_id: int):
+    """
+    Run the queue of a server if ops were pushed to it while its lock was
+    held, every holder of server_lock calls this once it released it.
+    """
+    if huey.storage.conn.llen(SERVER_QUEUE_KEY.format(server_id=server_id)):
+        server_queue_runner(server_id)
@@ -1,7 +1,9 @@
 import os
 import re
+import hashlib
 import typing as t
 import ansible_runner
+from huey.exceptions import TaskLockedException
 from uuid import uuid4
 from collections import defaultdict
 from distutils.dir_util import copy_tree
@@ -19,31 +21,119 @@ from app.db.schemas.port_usage import PortUsageCreate, PortUsageEdit
 
 from .config import huey
 from tasks.utils.runner import run_async, run
-from tasks.utils.server import prepare_priv_dir
-from tasks.utils.files import get_md5_for_file
+from tasks.utils.files import get_cached_md5_for_file
 from tasks.utils.handlers import update_facts, server_facts_event_handler
 
 
-def finished_handler(server_id: int, md5: str = None):
+ROLES_DIR = "ansible/project/roles"
+FILES_DIR = "ansible/project/files"
+PLAYBOOK = "ansible/project/server.yml"
+# "src: files/iptables.sh", "script: files/init.sh" in a role's tasks
+ROLE_FILE_PATTERN = re.compile(r"\bfiles/([\w.\-]+)")
+# Roles of server.yml which are skipped when their inputs did not change,
+# get_facts always runs
+SERVER_ROLES = ("server_init", "services_prepare", "scripts_sync")
+RECONCILED_KEY = "aurora:reconciled:{init_md5}"
+# Held while a reconcile is dispatched and running, later starts retry once
+# it expires if the fleet was still not reconciled
+RECONCILING_KEY = "aurora:reconciling:{init_md5}"
+RECONCILING_TTL = 60 * 60
+
+
+def get_role_md5(role: str) -> str:
+    """
+    md5 over server.yml, which decides when the role runs, every file of
+    the role and the files/ it ships to the host.
+    """
+    role_dir = f"{ROLES_DIR}/{role}"
+    hash_md5 = hashlib.md5()
+    hash_md5.update(f"server.yml={get_cached_md5_for_file(PLAYBOOK)}".encode())
+    shipped = set()
+    for root, dirs, files in os.walk(role_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            hash_md5.update(
+                f"\0{os.path.relpath(path, role_dir)}="
+                f"{get_cached_md5_for_file(path)}".encode()
+            )
+            if name.endswith(".yml"):
+                with open(path) as f:
+                    shipped.update(ROLE_FILE_PATTERN.findall(f.read()))
+    for name in sorted(shipped):
+        if os.path.isfile(path := f"{FILES_DIR}/{name}"):
+            hash_md5.update(
+                f"\0files/{name}={get_cached_md5_for_file(path)}".encode()
+            )
+    return hash_md5.hexdigest()
+
+
+def get_role_md5s() -> t.Dict[str, str]:
+    return {role: get_role_md5(role) for role in SERVER_ROLES}
+
+
+def get_init_md5() -> str:
+    hash_md5 = hashlib.md5()
+    hash_md5.update(f"server.yml={get_cached_md5_for_file(PLAYBOOK)}".encode())
+    for role, md5 in get_role_md5s().items():
+        hash_md5.update(f"\0{role}={md5}".encode())
+    return hash_md5.hexdigest()
+
+
+def get_init_roles(
+    prepare_services: bool = False, sync_scripts: bool = False, **kwargs
+) -> t.List[str]:
+    roles = ["server_init"]
+    if prepare_services:
+        roles.append("services_prepare")
+    if sync_scripts:
+        roles.append("scripts_sync")
+    return roles
+
+
+def get_changed_roles(
+    server: Server, role_md5s: t.Dict[str, str], **kwargs
+) -> t.List[str]:
+    deployed = server.config.get("init_roles") or {}
+    return [
+        role
+        for role in get_init_roles(**kwargs)
+        if deployed.get(role) != role_md5s[role]
+    ]
+
+
+def finished_handler(server_id: int, role_md5s: t.Dict[str, str] = None):
     def wrapper(runner):
         with db_session() as db:
             server = get_server(db, server_id)
         facts = runner.get_fact_cache(server.ansible_name)
-        update_facts(server.id, facts, md5=md5)
+        update_facts(
+            server.id,
+            facts,
+            role_md5s=role_md5s if runner.status == "successful" else None,
+        )
     return wrapper
 
 
 @huey.task(priority=3)
-def server_runner(server_id: int, **kwargs):
-    init_md5 = get_md5_for_file("ansible/project/server.yml")
+def server_runner(server_id: int, init_roles: t.List[str] = None, **kwargs):
+    """
+    Run server.yml with only init_roles, every eligible role by default,
+    their input md5s are stored on the server once the run succeeded.
+    """
+    if init_roles is None:
+        init_roles = get_init_roles(**kwargs)
+    role_md5s = get_role_md5s()
     with db_session() as db:
         server = get_server(db, server_id)
     run(
         server=server,
         playbook="server.yml",
-        extravars=kwargs,
+        extravars=dict(kwargs, init_roles=init_roles),
         event_handler=server_facts_event_handler(server.id),
-        finished_callback=finished_handler(server.id, init_md5),
+        finished_callback=finished_handler(
+            server.id, {role: role_md5s[role] for role in init_roles}
+        ),
     )
 
 
@@ -62,10 +152,59 @@ def connect_runner(
 
 
 @huey.task(priority=2)
-def servers_runner(**kwargs):
-    with db_session() as db:
-        servers = get_servers(db)
-    init_md5 = get_md5_for_file("ansible/project/server.yml")
-    for server in servers:
-        if "init" not in server.config or server.config["init"] != init_md5:
-            server_runner(server.id, **kwargs)
+def servers_runner(init_md5: str = None, **kwargs):
+    """
+    Run the servers whose roles changed, with init_md5 the digest is
+    marked reconciled once no server is left to run.
+    """
+    try:
+        with db_session() as db:
+            servers = get_servers(db)
+        role_md5s = get_role_md5s()
+        changed = False
+        for server in servers:
+            if init_roles := get_changed_roles(server, role_md5s, **kwargs):
+                changed = True
+                server_runner(server.id, init_roles=init_roles, **kwargs)
+    except Exception:
+        if init_md5:
+            huey.storage.conn.delete(RECONCILING_KEY.format(init_md5=init_md5))
+        raise
+    if init_md5 and not changed:
+        huey.storage.conn.set(RECONCILED_KEY.format(init_md5=init_md5), 1)
+
+
+@huey.on_startup()
+def reconcile_servers():
+    """
+    Initialize servers whose init inputs changed, once per deployment:
+    only the first worker to start hashes the tree and dispatches the
+    runs, later starts skip the digest once servers_runner found every
+    server up to date, or retry it after RECONCILING_TTL.
+    """
+    try:
+        with huey.lock_task("reconcile-servers"):
+            init_md5 = get_init_md5()
+            conn = huey.storage.conn
+            if conn.exists(RECONCILED_KEY.format(init_md5=init_md5)):
+                return
+            if not conn.set(
+                RECONCILING_KEY.format(init_md5=init_md5),
+                1,
+                nx=True,
+                ex=RECONCILING_TTL,
+            ):
+                return
+    except TaskLockedException:
+        return
+    print(f"Reconciling servers with init inputs {init_md5}")
+    try:
+        servers_runner(
+            init_md5=init_md5,
+            prepare_services=True,
+            sync_scripts=True,
+            init_iptables=True,
+        )
+    except Exception as e:
+        conn.delete(RECONCILING_KEY.format(init_md5=init_md5))
+        print(f"Reconciling servers with {init_md5} failed: {e}")
@@ -1,10 +1,59 @@
+import typing as t
+
 from app.db.session import db_session
+from app.db.crud.port import get_limited_ports
 from app.db.crud.server import get_server
 
 from .config import huey
+from tasks.queue import server_queue_handler
 from tasks.utils.runner import run
 
 
+def get_tc_sync_args(limits: t.List[t.Dict]) -> str:
+    """
+    `tc.sh sync` args, one "<port>,<egress>,<ingress>" spec per port.
+    """
+    specs = []
+    for limit in limits:
+        egress, ingress = (
+            f"{limit[key]}kbit" if limit.get(key) else ""
+            for key in ("egress_limit", "ingress_limit")
+        )
+        specs.append(f"{limit['port_num']},{egress},{ingress}")
+    return " sync " + " ".join(specs)
+
+
+@server_queue_handler("tc", key=lambda op: op["port_num"])
+def run_tc(server_id: int, ops: t.List[t.Dict]):
+    """
+    The limits of every port are stored in Port.config before the ops are
+    queued, so the whole tree of the server is rendered again from it and
+    the ops themselves are discarded, they only trigger the run.
+    """
+    run_tc_sync(server_id)
+
+
+def run_tc_sync(server_id: int):
+    with db_session() as db:
+        server = get_server(db, server_id)
+        limits = [
+            {
+                "port_num": port.num,
+                "egress_limit": port.config.get("egress_limit"),
+                "ingress_limit": port.config.get("ingress_limit"),
+            }
+            for port in get_limited_ports(db, server_id)
+        ]
+    run(
+        server=server,
+        playbook="tc.yml",
+        extravars={
+            "host": server.ansible_name,
+            "tc_args_list": [get_tc_sync_args(limits)],
+        },
+    )
+
+
 @huey.task(priority=1)
 def tc_runner(
     server_id: int,
@@ -12,17 +61,18 @@ def tc_runner(
     egress_limit: int = None,
     ingress_limit: int = None
 ):
-    with db_session() as db:
-        server = get_server(db, server_id)
-    args = ""
-    if egress_limit:
-        args += f' -e={egress_limit}kbit'
-    if ingress_limit:
-        args += f' -i={ingress_limit}kbit'
-    args += f' {port_num}'
-
-    run(
-        server=server,
-        playbook="tc.yml",
-        extravars={"host": server.ansible_name, "tc_args": args},
+    run_tc(
+        server_id,
+        [
+            {
+                "port_num": port_num,
+                "egress_limit": egress_limit,
+                "ingress_limit": ingress_limit,
+            }
+        ],
     )
+
+
+@huey.task(priority=1)
+def tc_sync_runner(server_id: int):
+    run_tc_sync(server_id)
@@ -1,29 +1,235 @@
+import json
+import time
+import subprocess
+import typing as t
+from contextlib import ExitStack
 from huey import crontab
+from huey.exceptions import TaskLockedException
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-from app.core.config import TRAFFIC_INTERVAL_SECONDS
+from app.core.config import (
+    TRAFFIC_INTERVAL_SECONDS,
+    TRAFFIC_CONCURRENCY,
+    TRAFFIC_TIMEOUT_SECONDS,
+    TRAFFIC_SWEEP_MODE,
+    TRAFFIC_SHARD_SIZE,
+    TRAFFIC_FORKS,
+    PROBE_EXECUTOR,
+    USAGE_SAMPLE_RETENTION_DAYS,
+    USAGE_HOURLY_RETENTION_DAYS,
+    USAGE_DAILY_RETENTION_DAYS,
+)
+from app.db.constants import UsageResolutionEnum
 from app.db.session import db_session
 from app.db.models.server import Server
 from app.db.crud.server import get_server_with_ports_usage, get_servers
+from app.db.crud.port_usage import (
+    rollup_port_usage_history,
+    prune_port_usage_history,
+)
 
-from .config import huey
+from .config import huey, server_lock
+from .queue import kick_server_queue
 from tasks.utils.runner import run
-from tasks.utils.handlers import iptables_finished_handler
+from tasks.utils.server import get_inventory
+from tasks.utils.ssh import probe_iptables
+from tasks.utils.handlers import (
+    iptables_facts_handler,
+    iptables_finished_handler,
+)
+
+
+TRAFFIC_SWEEP_KEY = "aurora:traffic:sweep"
+
+
+def probe_traffic(server_id: int, executor: str = None) -> str:
+    """
+    Collect traffic of one server within TRAFFIC_TIMEOUT_SECONDS through
+    the ansible playbook or a direct ssh probe, returns the runner status.
+    """
+    executor = executor or PROBE_EXECUTOR
+    started = time.time()
+    try:
+        with db_session() as db:
+            server = get_server_with_ports_usage(db, server_id)
+        if executor == "ssh":
+            iptables_facts_handler(
+                server,
+                probe_iptables(server, timeout=TRAFFIC_TIMEOUT_SECONDS),
+            )
+            status = "successful"
+        else:
+            runner = run(
+                server=server,
+                playbook="traffic.yml",
+                finished_callback=iptables_finished_handler(server_id),
+                timeout=TRAFFIC_TIMEOUT_SECONDS,
+            )
+            status = runner.status if runner else "failed"
+    except subprocess.TimeoutExpired:
+        status = "timeout"
+    except Exception as e:
+        print(f"Traffic of server {server_id} failed: {e}")
+        status = "failed"
+    print(
+        f"Traffic of server {server_id} via {executor}: {status} "
+        f"in {time.time() - started:.2f}s"
+    )
+    return status
+
+
+def collect_traffic(server_id: int, executor: str = None) -> str:
+    """
+    Probe traffic unless the server is busy with other ansible work,
+    "skipped" is returned then.
+    """
+    try:
+        with server_lock(server_id):
+            status = probe_traffic(server_id, executor)
+    except TaskLockedException:
+        print(f"Server {server_id} is busy, skip collecting traffic")
+        return "skipped"
+    # Ops enqueued meanwhile, e.g. by correct_running_services
+    kick_server_queue(server_id)
+    return status
 
 
 @huey.task()
-def traffic_server_runner(server_id: Server):
-    with db_session() as db:
-        server = get_server_with_ports_usage(db, server_id)
-    run(
-        server=server,
-        playbook="traffic.yml",
-        finished_callback=iptables_finished_handler(server.id),
+def traffic_server_runner(server_id: int, executor: str = None):
+    return collect_traffic(server_id, executor)
+
+
+def collect_traffic_shard(servers: t.List[Server]) -> t.List[str]:
+    """
+    Run traffic.yml once against a shard of servers with TRAFFIC_FORKS,
+    returns one status per server, busy servers are skipped.
+    """
+    statuses = []
+    locked = []
+    with ExitStack() as stack:
+        for server in servers:
+            try:
+                stack.enter_context(server_lock(server.id))
+                locked.append(server)
+            except TaskLockedException:
+                statuses.append("skipped")
+        if locked:
+            statuses += probe_traffic_shard(locked)
+    # Ops enqueued meanwhile, e.g. by correct_running_services
+    for server in locked:
+        kick_server_queue(server.id)
+    return statuses
+
+
+def probe_traffic_shard(locked: t.List[Server]) -> t.List[str]:
+    """
+    Run traffic.yml against servers whose locks are held by the caller.
+    """
+    statuses = []
+    started = time.time()
+    try:
+        runner = run(
+            # A single server keeps its own priv dir and passwords
+            server=locked[0]
+            if len(locked) == 1
+            else {
+                "id": f"traffic-{locked[0].id}",
+                "ansible_name": ":".join(s.ansible_name for s in locked),
+            },
+            playbook="traffic.yml",
+            inventory=get_inventory(*(s.__dict__ for s in locked)),
+            forks=TRAFFIC_FORKS,
+            timeout=TRAFFIC_TIMEOUT_SECONDS,
+        )
+    except Exception as e:
+        print(f"Traffic of servers {[s.id for s in locked]} failed: {e}")
+        return ["failed"] * len(locked)
+
+    for server in locked:
+        if not (facts := runner.get_fact_cache(server.ansible_name)):
+            statuses.append(
+                "timeout" if runner.status == "timeout" else "failed"
+            )
+            continue
+        try:
+            with db_session() as db:
+                db_server = get_server_with_ports_usage(db, server.id)
+            iptables_facts_handler(db_server, facts)
+            statuses.append("successful")
+        except Exception as e:
+            print(f"Traffic of server {server.id} failed: {e}")
+            statuses.append("failed")
+    print(
+        f"Traffic of {len(locked)} servers via one playbook: "
+        f"{runner.status} in {time.time() - started:.2f}s"
     )
+    return statuses
 
 
 @huey.periodic_task(crontab(minute=f"*/{int(TRAFFIC_INTERVAL_SECONDS)//60}"))
+@huey.lock_task("traffic-sweep")
 def traffic_runner():
+    started = time.time()
     with db_session() as db:
         servers = get_servers(db)
-    for server in servers:
-        traffic_server_runner(server.id)
+    with ThreadPoolExecutor(max_workers=TRAFFIC_CONCURRENCY) as pool:
+        if TRAFFIC_SWEEP_MODE == "inventory":
+            # Password prompts are per run, such servers get their own one
+            shared = [
+                s for s in servers if not (s.ssh_password or s.sudo_password)
+            ]
+            shards = [
+                shared[i : i + TRAFFIC_SHARD_SIZE]
+                for i in range(0, len(shared), TRAFFIC_SHARD_SIZE)
+            ] + [[s] for s in servers if s.ssh_password or s.sudo_password]
+            statuses = sum(pool.map(collect_traffic_shard, shards), [])
+        else:
+            statuses = list(
+                pool.map(collect_traffic, [server.id for server in servers])
+            )
+    report = {
+        "finished_at": int(time.time()),
+        "duration": round(time.time() - started, 2),
+        "servers": len(servers),
+        "timeout": statuses.count("timeout"),
+        "failed": statuses.count("failed"),
+        "skipped": statuses.count("skipped"),
+    }
+    huey.storage.conn.set(TRAFFIC_SWEEP_KEY, json.dumps(report))
+    print(
+        f"Traffic sweep of {report['servers']} servers took "
+        f"{report['duration']}s, {report['timeout']} missed the "
+        f"{TRAFFIC_TIMEOUT_SECONDS}s deadline, {report['failed']} failed, "
+        f"{report['skipped']} skipped"
+    )
+    return report
+
+
+@huey.periodic_task(crontab(minute="5"))
+def traffic_history_runner():
+    now = datetime.utcnow()
+    this_hour = now.replace(minute=0, second=0, microsecond=0)
+    yesterday = this_hour.replace(hour=0) - timedelta(days=1)
+    with db_session() as db:
+        rollup_port_usage_history(
+            db,
+            UsageResolutionEnum.MINUTE_10,
+            UsageResolutionEnum.HOUR,
+            since=this_hour - timedelta(hours=2),
+        )
+        rollup_port_usage_history(
+            db,
+            UsageResolutionEnum.HOUR,
+            UsageResolutionEnum.DAY,
+            since=yesterday,
+        )
+        for resolution, days in (
+            (UsageResolutionEnum.MINUTE_10, USAGE_SAMPLE_RETENTION_DAYS),
+            (UsageResolutionEnum.HOUR, USAGE_HOURLY_RETENTION_DAYS),
+            (UsageResolutionEnum.DAY, USAGE_DAILY_RETENTION_DAYS),
+        ):
+            deleted = prune_port_usage_history(
+                db, resolution, now - timedelta(days=days)
+            )
+            print(f"Pruned {deleted} {resolution.value} usage history rows")
@@ -1,4 +1,10 @@
+import os
 import hashlib
+import typing as t
+
+
+# path -> (mtime_ns, size, md5)
+MD5_CACHE: t.Dict[str, t.Tuple[int, int, str]] = {}
 
 
 def get_md5_for_file(path: str) -> str:
@@ -6,4 +12,18 @@ def get_md5_for_file(path: str) -> str:
     with open(path, "rb") as f:
         for chunk in iter(lambda: f.read(4096), b""):
             hash_md5.update(chunk)
-    return hash_md5.hexdigest()
\ No newline at end of file
+    return hash_md5.hexdigest()
+
+
+def get_cached_md5_for_file(path: str) -> str:
+    """
+    md5 of a file, only rehashed when its mtime or size changed.
+    """
+    stat = os.stat(path)
+    cached = MD5_CACHE.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    md5 = get_md5_for_file(path)
+    MD5_CACHE[path] = (stat.st_mtime_ns, stat.st_size, md5)
+    return md5
+
@@ -10,7 +10,9 @@ from tasks.utils.usage import update_traffic
 from tasks.utils.rule import correct_running_services
 
 
-def update_facts(server_id: int, facts: t.Dict, md5: str = None):
+def update_facts(
+    server_id: int, facts: t.Dict, role_md5s: t.Dict[str, str] = None
+):
     with db_session() as db:
         db_server = get_server(db, server_id)
         if facts.get("ansible_os_family"):
@@ -48,8 +50,11 @@ def update_facts(server_id: int, facts: t.Dict, md5: str = None):
         ]:
             if func in facts:
                 db_server.config[func] = facts.get(func)
-        if md5 is not None:
-            db_server.config["init"] = md5
+        if role_md5s:
+            db_server.config["init_roles"] = {
+                **(db_server.config.get("init_roles") or {}),
+                **role_md5s,
+            }
         db.add(db_server)
         db.commit()
 
@@ -69,6 +74,38 @@ def update_rule_error(server_id: int, port_id: int, facts: t.Dict):
         db.commit()
 
 
+def update_rule_digest(server_id: int, port_id: int, digest: str):
+    """
+    Record the digest of a successful deploy, the host runs it right now.
+    """
+    with db_session() as db:
+        db_rule = get_forward_rule(db, server_id, port_id)
+        if db_rule is None:
+            return
+        db_rule.config["digest"] = digest
+        db_rule.config["reported_digest"] = digest
+        db.add(db_rule)
+        db.commit()
+
+
+def iptables_facts_handler(
+    server: Server,
+    facts: t.Dict,
+    port_id: int = None,
+    accumulate: bool = False,
+    update_traffic_bool: bool = True,
+):
+    if (traffic := facts.get("traffic", "")) and update_traffic_bool:
+        update_traffic(server, traffic, accumulate=accumulate)
+    if rules := facts.get("rules", ""):
+        correct_running_services(server.id, rules)
+    if port_id is not None and (
+        facts.get("error") or facts.get("systemd_error")
+    ):
+        update_rule_error(server.id, port_id, facts)
+    update_facts(server.id, facts)
+
+
 def iptables_finished_handler(
     server_id: int,
     port_id: int = None,
@@ -80,17 +117,41 @@ def iptables_finished_handler(
             server = get_server(db, server_id)
         facts = runner.get_fact_cache(server.ansible_name)
         if facts:
-            if (traffic := facts.get("traffic", "")) and update_traffic_bool:
-                update_traffic(
-                    server, traffic, accumulate=accumulate
+            iptables_facts_handler(
+                server, facts, port_id, accumulate, update_traffic_bool
+            )
+
+    return wrapper
+
+
+def app_batch_finished_handler(
+    server_id: int,
+    port_ids: t.Dict[int, int],
+    digests: t.Dict[int, str] = None,
+):
+    """
+    Report status of every port deployed by app_batch.yml, port_ids maps
+    local port numbers to port ids and digests port ids to app digests.
+    """
+
+    def wrapper(runner):
+        with db_session() as db:
+            server = get_server(db, server_id)
+        facts = runner.get_fact_cache(server.ansible_name) or {}
+        app_status = facts.get("app_status", {})
+        for local_port, port_id in port_ids.items():
+            systemd_status = app_status.get(str(local_port), "")
+            if "Active: active" in systemd_status:
+                status_handler(port_id, {"status": "successful"}, True)
+                if digests and port_id in digests:
+                    update_rule_digest(server.id, port_id, digests[port_id])
+            else:
+                status_handler(port_id, {"status": "failed"}, True)
+                update_rule_error(
+                    server.id, port_id, {"systemd_error": systemd_status}
                 )
-            if rules := facts.get("rules", ""):
-                correct_running_services(server.id, rules)
-            if port_id is not None and (
-                facts.get("error") or facts.get("systemd_error")
-            ):
-                update_rule_error(server.id, port_id, facts)
-            update_facts(server.id, facts)
+        if facts:
+            iptables_facts_handler(server, facts, accumulate=True)
 
     return wrapper
 
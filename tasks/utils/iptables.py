@@ -0,0 +1,12 @@
+from app.db.models.port_forward import PortForwardRule
+
+
+def get_iptables_op(rule: PortForwardRule, update_status: bool = True):
+    return {
+        "port_id": rule.port.id,
+        "local_port": rule.port.num,
+        "update_status": update_status,
+        "remote_address": rule.config.get("remote_address"),
+        "remote_port": rule.config.get("remote_port"),
+        "forward_type": rule.config.get("type", "ALL").upper(),
+    }
@@ -1,64 +1,97 @@
-import os
 import typing as t
 import ansible_runner
+from shutil import rmtree
 from uuid import uuid4
 
 from app.db.models.server import Server
 
-from tasks.utils.server import prepare_priv_dir, prepare_priv_dir_dict
+from tasks.utils.server import (
+    get_inventory,
+    get_runner_kwargs,
+    prepare_run_dir_dict,
+)
 
 
-def run_async(
+def prepare_run(
     server: t.Union[Server, t.Dict],
-    playbook: str,
     extravars: t.Dict = None,
-    ident: str = None,
-    **kwargs
-):
-    if not server:
-        print("Server not found!")
-        return
+    inventory: t.Dict = None,
+) -> t.Tuple[str, t.Dict]:
+    """
+    Scratch private data dir and runner kwargs of a run, the scratch dir
+    must be removed by the caller. Without an inventory only the server
+    itself is in it.
+    """
     if extravars is None:
         extravars = {}
     if isinstance(server, dict):
-        priv_data_dir = prepare_priv_dir_dict(server)
         extravars["host"] = server["ansible_name"]
     else:
-        priv_data_dir = prepare_priv_dir(server)
         extravars["host"] = server.ansible_name
-    return ansible_runner.run_async(
-        ident=uuid4() if ident is None else ident,
-        private_data_dir=priv_data_dir,
+        extravars.setdefault("firewall", server.config.get("firewall"))
+        server = server.__dict__
+    return prepare_run_dir_dict(server), dict(
+        get_runner_kwargs(server),
         project_dir="ansible/project",
-        playbook=playbook,
+        inventory=get_inventory(server) if inventory is None else inventory,
         extravars=extravars,
-        **kwargs
     )
 
 
+def run_async(
+    server: t.Union[Server, t.Dict],
+    playbook: str,
+    extravars: t.Dict = None,
+    ident: str = None,
+    inventory: t.Dict = None,
+    finished_callback: t.Callable = None,
+    **kwargs
+):
+    if not server:
+        print("Server not found!")
+        return
+    priv_data_dir, runner_kwargs = prepare_run(server, extravars, inventory)
+
+    def finished(runner):
+        try:
+            if finished_callback is not None:
+                finished_callback(runner)
+        finally:
+            rmtree(priv_data_dir, ignore_errors=True)
+
+    try:
+        return ansible_runner.run_async(
+            ident=uuid4() if ident is None else ident,
+            private_data_dir=priv_data_dir,
+            playbook=playbook,
+            finished_callback=finished,
+            **runner_kwargs,
+            **kwargs
+        )
+    except Exception:
+        rmtree(priv_data_dir, ignore_errors=True)
+        raise
+
+
 def run(
     server: t.Union[Server, t.Dict],
     playbook: str,
     extravars: t.Dict = None,
     ident: str = None,
+    inventory: t.Dict = None,
     **kwargs
 ):
     if not server:
         print("Server not found!")
         return
-    if extravars is None:
-        extravars = {}
-    if isinstance(server, dict):
-        priv_data_dir = prepare_priv_dir_dict(server)
-        extravars["host"] = server["ansible_name"]
-    else:
-        priv_data_dir = prepare_priv_dir(server)
-        extravars["host"] = server.ansible_name
-    return ansible_runner.run(
-        ident=uuid4() if ident is None else ident,
-        private_data_dir=priv_data_dir,
-        project_dir="ansible/project",
-        playbook=playbook,
-        extravars=extravars,
-        **kwargs
-    )
+    priv_data_dir, runner_kwargs = prepare_run(server, extravars, inventory)
+    try:
+        return ansible_runner.run(
+            ident=uuid4() if ident is None else ident,
+            private_data_dir=priv_data_dir,
+            playbook=playbook,
+            **runner_kwargs,
+            **kwargs
+        )
+    finally:
+        rmtree(priv_data_dir, ignore_errors=True)
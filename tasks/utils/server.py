@@ -1,37 +1,83 @@
-import os
 import typing as t
-from shutil import copytree
+import tempfile
 
-from app.db.models.server import Server
+import yaml
 
 
-def prepare_priv_dir_dict(server: t.Dict) -> str:
-    priv_dir = f"ansible/priv_data_dirs/{server.get('id', 0)}"
-    os.makedirs(priv_dir, exist_ok=True)
-    copytree("ansible/inventory", f"{priv_dir}/inventory", dirs_exist_ok=True)
-    copytree("ansible/env", f"{priv_dir}/env", dirs_exist_ok=True)
+ENVVARS_PATH = "ansible/env/envvars"
+INVENTORY_HOST_VARS = ("ansible_host", "ansible_port", "ansible_user")
+ARTIFACTS_DIR = "ansible/priv_data_dirs/{server_id}/artifacts"
+
+
+def unescape_password(password: str) -> str:
+    """
+    The API stores passwords escaped for a double quoted yaml scalar, the
+    format env/passwords used to be written in.
+    """
+    return yaml.safe_load(f'"{password}"')
+
+
+def get_runner_kwargs(server: t.Dict) -> t.Dict:
+    """
+    Environment and credentials of a server as ansible_runner kwargs, they
+    are passed inline and never written under ansible/.
+    """
+    with open(ENVVARS_PATH) as f:
+        envvars = yaml.safe_load(f) or {}
+    if not server.get("sudo_password"):
+        envvars["ANSIBLE_PIPELINING"] = True
     passwords = {}
     cmdline = ""
-    if server.get("ssh_password") or server.get("sudo_password"):
-        if server.get("ssh_password"):
-            passwords["^SSH [pP]assword"] = server.get("ssh_password")
-            cmdline += " --ask-pass"
-        if server.get("sudo_password"):
-            passwords["^BECOME [pP]assword"] = server.get("sudo_password")
-            cmdline += " -K"
-    if not server.get("sudo_password"):
-        with open(f"{priv_dir}/env/envvars", "a+") as f:
-            f.write("ANSIBLE_PIPELINING: True\n")
+    if server.get("ssh_password"):
+        passwords["^SSH [pP]assword"] = unescape_password(
+            server.get("ssh_password")
+        )
+        cmdline += " --ask-pass"
+    if server.get("sudo_password"):
+        passwords["^BECOME [pP]assword"] = unescape_password(
+            server.get("sudo_password")
+        )
+        cmdline += " -K"
+    kwargs = {
+        "envvars": {key: str(val) for key, val in envvars.items()},
+        "artifact_dir": ARTIFACTS_DIR.format(server_id=server.get("id", 0)),
+    }
     if passwords:
-        with open(f"{priv_dir}/env/passwords", "w+") as f:
-            f.write("---\n")
-            for key, val in passwords.items():
-                f.write(f'"{key}": "{val}"\n')
-    if cmdline:
-        with open(f"{priv_dir}/env/cmdline", "w+") as f:
-            f.write(cmdline)
-    return priv_dir
-
-
-def prepare_priv_dir(server: Server) -> str:
-    return prepare_priv_dir_dict(server.__dict__)
+        kwargs["passwords"] = passwords
+        kwargs["cmdline"] = cmdline
+    return kwargs
+
+
+def get_inventory(*servers: t.Dict) -> t.Dict:
+    """
+    Inventory of only the given servers, built from their rows so nothing
+    fleet wide is read or written for a run.
+    """
+    return {
+        "all": {
+            "hosts": {
+                server["ansible_name"]: get_host_vars(server)
+                for server in servers
+            }
+        }
+    }
+
+
+def get_host_vars(server: t.Dict) -> t.Dict:
+    host_vars = {
+        var: server.get(var)
+        for var in INVENTORY_HOST_VARS
+        if server.get(var) is not None
+    }
+    # Shared runs have no per server extravars, the backend goes here
+    if firewall := (server.get("config") or {}).get("firewall"):
+        host_vars["firewall"] = firewall
+    return host_vars
+
+
+def prepare_run_dir_dict(server: t.Dict) -> str:
+    """
+    Create a scratch private data dir for one run, concurrent runs never
+    share it and the caller removes it once the run is over.
+    """
+    return tempfile.mkdtemp(prefix=f"aurora-run-{server.get('id', 0)}-")
@@ -0,0 +1,92 @@
+import os
+import typing as t
+import subprocess
+
+from app.db.models.server import Server
+
+from tasks.utils.server import unescape_password
+
+
+SSH_CONTROL_DIR = "/tmp/aurora-ssh"
+SSH_CONTROL_PERSIST_SECONDS = 600
+IPTABLES_SCRIPT = "/usr/local/bin/iptables.sh"
+
+
+class SSHProbeError(Exception):
+    pass
+
+
+def ssh_command(server: t.Dict) -> t.List[str]:
+    """
+    Build the ssh command line for a server, connections are multiplexed
+    over one persistent master per host/port/user.
+    """
+    os.makedirs(SSH_CONTROL_DIR, mode=0o700, exist_ok=True)
+    command = [
+        "ssh",
+        "-o",
+        "ControlMaster=auto",
+        "-o",
+        f"ControlPath={SSH_CONTROL_DIR}/%C",
+        "-o",
+        f"ControlPersist={SSH_CONTROL_PERSIST_SECONDS}",
+        "-o",
+        "StrictHostKeyChecking=no",
+        "-o",
+        "ConnectTimeout=10",
+        "-p",
+        str(server.get("ansible_port") or 22),
+        f"{server.get('ansible_user') or 'root'}@"
+        f"{server.get('ansible_host') or server.get('ansible_name')}",
+    ]
+    if server.get("ssh_password"):
+        return ["sshpass", "-e"] + command
+    return command[:1] + ["-o", "BatchMode=yes"] + command[1:]
+
+
+def ssh_run(
+    server: t.Union[Server, t.Dict], remote_command: str, timeout: int = None
+) -> str:
+    if not isinstance(server, dict):
+        server = server.__dict__
+    stdin = None
+    if (server.get("ansible_user") or "root") != "root":
+        if server.get("sudo_password"):
+            remote_command = f"sudo -S -p '' {remote_command}"
+            stdin = f"{unescape_password(server.get('sudo_password'))}\n"
+        else:
+            remote_command = f"sudo -n {remote_command}"
+    env = None
+    if server.get("ssh_password"):
+        env = dict(
+            os.environ, SSHPASS=unescape_password(server.get("ssh_password"))
+        )
+    result = subprocess.run(
+        ssh_command(server) + [remote_command],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        env=env,
+    )
+    # ssh exits with 255 on its own errors, anything else is the script's
+    if result.returncode == 255:
+        raise SSHProbeError(result.stderr.strip())
+    return result.stdout
+
+
+def probe_iptables(
+    server: t.Union[Server, t.Dict], timeout: int = None
+) -> t.Dict[str, str]:
+    """
+    Same facts as the traffic playbook, by running the deployed iptables
+    script directly with the server's firewall backend.
+    """
+    if not isinstance(server, dict):
+        server = server.__dict__
+    backend = (server.get("config") or {}).get("firewall") or "iptables"
+    script = f"bash {IPTABLES_SCRIPT} --backend={backend}"
+    return {
+        "traffic": ssh_run(server, f"{script} list_all", timeout).strip(),
+        "rules": ssh_run(server, f"{script} list_rules", timeout).strip(),
+    }
@@ -0,0 +1,87 @@
+import re
+import json
+import typing as t
+from io import StringIO
+from collections import defaultdict
+
+# `iptables -nxvL` line: "pkts bytes target prot ... /* UPLOAD 1234->... */"
+TRAFFIC_LINE_PATTERN = re.compile(
+    r"\s*\d+\s+(\d+)\s.*\/\* (UPLOAD|DOWNLOAD)(?:\-UDP)? ([0-9]+)->"
+)
+# `ipset save` counter: "add aurora-fwd-up4 1.1.1.1,tcp:80 packets 1 bytes 60
+# comment "1234"", the entry itself is the port for aurora-up/down sets
+COUNTER_LINE_PATTERN = re.compile(
+    r"add aurora-(?:fwd-)?(up|down)[46]? (\S+) packets \d+ bytes (\d+)"
+    r"(?: comment \"([0-9]+)\")?"
+)
+COUNTER_DIRECTIONS = {"up": "upload", "down": "download"}
+# `nft -j list counters` prints one {"nftables": [...]} document per line,
+# counters of the "inet aurora" table are named up_<port>/down_<port>
+NFT_COUNTER_NAME_PATTERN = re.compile(r"(up|down)_([0-9]+)$")
+
+
+def iter_nft_counters(line: str) -> t.Iterator[t.Tuple[int, str, int]]:
+    for item in json.loads(line).get("nftables", []):
+        counter = item.get("counter")
+        if not counter or counter.get("table") != "aurora":
+            continue
+        if result := NFT_COUNTER_NAME_PATTERN.match(counter.get("name", "")):
+            yield int(result.group(2)), COUNTER_DIRECTIONS[
+                result.group(1)
+            ], counter["bytes"]
+
+
+def iter_traffic(
+    traffic: t.Union[str, t.Iterable[str]]
+) -> t.Iterator[t.Tuple[int, str, int]]:
+    """
+    Yield (port_num, "download" | "upload", bytes) for every accounting
+    line, consuming the output lazily line by line.
+    """
+    if isinstance(traffic, str):
+        traffic = StringIO(traffic)
+    match = TRAFFIC_LINE_PATTERN.match
+    counter_match = COUNTER_LINE_PATTERN.match
+    for line in traffic:
+        if result := match(line):
+            yield int(result.group(3)), result.group(2).lower(), int(
+                result.group(1)
+            )
+        elif result := counter_match(line):
+            yield int(result.group(4) or result.group(2)), COUNTER_DIRECTIONS[
+                result.group(1)
+            ], int(result.group(3))
+        elif line.startswith('{"nftables"'):
+            yield from iter_nft_counters(line)
+
+
+def aggregate_traffic(
+    traffic: t.Union[str, t.Iterable[str]]
+) -> t.DefaultDict[int, t.Dict[str, int]]:
+    traffics = defaultdict(lambda: {"download": 0, "upload": 0})
+    for port_num, direction, count in iter_traffic(traffic):
+        traffics[port_num][direction] += count
+    return traffics
+
+
+def generate_traffic(rules: int) -> str:
+    comments = ("UPLOAD", "DOWNLOAD", "UPLOAD-UDP", "DOWNLOAD-UDP")
+    return "\n".join(
+        f"{idx * 7:>8} {idx * 1031:>12} ACCEPT     tcp  --  *      *       "
+        f"0.0.0.0/0            10.0.{idx // 250 % 250}.{idx % 250}"
+        f"          tcp dpt:{10000 + idx // 4} "
+        f"/* {comments[idx % 4]} {10000 + idx // 4}->10.0.0.1:80 */"
+        for idx in range(rules)
+    )
+
+
+if __name__ == "__main__":
+    import timeit
+
+    traffic = generate_traffic(10000)
+    rounds = 20
+    seconds = timeit.timeit(lambda: aggregate_traffic(traffic), number=rounds)
+    print(
+        f"Parsed 10000 rules {rounds} times, "
+        f"{seconds / rounds * 1000:.2f} ms per sweep"
+    )
@@ -1,82 +1,148 @@
-import re
+import time
 import typing as t
 from datetime import datetime
 from collections import defaultdict
 from sqlalchemy.orm import Session
 
+from app.core.config import USAGE_SAMPLE_SECONDS
 from app.db.constants import LimitActionEnum
 from app.db.session import db_session
 from app.db.models.port import Port
 from app.db.models.user import User
-from app.db.models.server import Server
+from app.db.models.server import Server, ServerUser
 from app.db.models.port_forward import PortForwardRule
-from app.db.crud.port import get_port_with_num, get_port_by_id
-from app.db.crud.port_forward import delete_forward_rule, get_forward_rule
-from app.db.crud.port_usage import create_port_usage, edit_port_usage
-from app.db.crud.server import get_server_with_ports_usage, get_servers, get_server_users
-from app.db.schemas.port_usage import PortUsageCreate, PortUsageEdit
+from app.db.crud.port import get_port_by_id
+from app.db.crud.port_forward import get_forward_rule
+from app.db.crud.port_usage import increase_port_usages
+from app.db.crud.server import (
+    get_server_with_ports_usage,
+    get_servers,
+    get_server_users,
+    get_server_users_usage,
+)
+from app.db.schemas.port_usage import PortUsageCreate
 from app.db.schemas.port_forward import PortForwardRuleOut
 from app.db.schemas.server import ServerEdit
 
-from tasks.port import clean_port_no_update_runner
-from tasks.tc import tc_runner
+from tasks.config import huey
+from tasks.queue import enqueue_server_task, enqueue_server_tasks
+from tasks.utils.traffic import aggregate_traffic
 
 
-def update_usage(
+TRAFFIC_COUNTERS_KEY = "aurora:traffic:{server_id}"
+
+
+def get_traffic_counters(server_id: int) -> t.DefaultDict[int, t.Dict]:
+    counters = defaultdict(dict)
+    for field, value in huey.storage.conn.hgetall(
+        TRAFFIC_COUNTERS_KEY.format(server_id=server_id)
+    ).items():
+        port_num, direction = field.decode().split(":")
+        counters[int(port_num)][direction] = int(value)
+    return counters
+
+
+def set_traffic_counters(server_id: int, counters: t.Dict) -> None:
+    mapping = {
+        f"{port_num}:{direction}": count
+        for port_num, counter in counters.items()
+        for direction, count in counter.items()
+    }
+    if mapping:
+        huey.storage.conn.hset(
+            TRAFFIC_COUNTERS_KEY.format(server_id=server_id), mapping=mapping
+        )
+
+
+def clear_traffic_counters(server_id: int, port_nums: t.List[int]) -> None:
+    huey.storage.conn.hdel(
+        TRAFFIC_COUNTERS_KEY.format(server_id=server_id),
+        *[
+            f"{port_num}:{direction}"
+            for port_num in port_nums
+            for direction in ("download", "upload")
+        ],
+    )
+
+
+def update_usages(
     db: Session,
-    prev_ports: t.Dict,
-    db_ports: t.Dict,
-    server_id: int,
-    port_num: int,
-    usage: t.Dict,
+    server: Server,
+    traffics: t.Dict,
     accumulate: bool = False,
 ):
-    if port_num not in db_ports:
-        db_port = get_port_with_num(db, server_id, port_num)
-        if not db_port:
-            print(f"Port not found, num: {port_num}, server_id: {server_id}")
-            return
-        if not db_port.usage:
-            print(
-                f"No usage found, creating usage for port id: {db_port.id} {db_port.num}"
-            )
-            create_port_usage(
-                db, db_port.id, PortUsageCreate(port_id=db_port.id)
+    """
+    Add the traffic since the last sweep to the port usages.
+
+    The raw iptables counters of the last sweep are kept in redis, the
+    `*_accumulate` columns hold the usage when the current counters started,
+    so `download - download_accumulate` is the fallback if redis lost them.
+    With `accumulate` the counters are about to be reset by the caller.
+    """
+    ports = {port.num: port for port in server.ports}
+    counters = get_traffic_counters(server.id)
+    port_usages = []
+    for port_num, usage in traffics.items():
+        if port_num not in ports:
+            print(f"Port not found, num: {port_num}, server_id: {server.id}")
+            continue
+        port = ports[port_num]
+        port_usage = PortUsageCreate(port_id=port.id)
+        for direction in ("download", "upload"):
+            count = usage.get(direction, 0)
+            if direction in counters[port_num]:
+                last = counters[port_num][direction]
+            elif port.usage:
+                last = max(
+                    getattr(port.usage, direction)
+                    - getattr(port.usage, f"{direction}_accumulate"),
+                    0,
+                )
+            else:
+                last = 0
+            if count >= last:
+                delta, accumulate_delta = count - last, 0
+            else:
+                print(
+                    f"Counter reset detected, port: {port_num} {direction}, "
+                    f"server_id: {server.id}, {last}->{count}"
+                )
+                delta, accumulate_delta = count, last
+            if accumulate:
+                accumulate_delta = last + delta
+            setattr(port_usage, direction, delta)
+            setattr(port_usage, f"{direction}_accumulate", accumulate_delta)
+            counters[port_num][direction] = 0 if accumulate else count
+        if any(
+            (
+                port_usage.download,
+                port_usage.upload,
+                port_usage.download_accumulate,
+                port_usage.upload_accumulate,
             )
-            db.refresh(db_port)
-        db_ports[port_num] = db_port
-
-    port_usage = PortUsageEdit(port_id=db_ports[port_num].id)
-    if (
-        port_num not in prev_ports
-        or not prev_ports[port_num].usage
-        or prev_ports[port_num].usage.download_checkpoint
-        == db_ports[port_num].usage.download_checkpoint
-    ):
-        download_usage = (
-            usage.get("download", 0)
-            + db_ports[port_num].usage.download_accumulate
-        )
-        port_usage.download = download_usage
-        if accumulate:
-            port_usage.download_accumulate = download_usage
-    if (
-        port_num not in prev_ports
-        or not prev_ports[port_num].usage
-        or prev_ports[port_num].usage.upload_checkpoint
-        == db_ports[port_num].usage.upload_checkpoint
-    ):
-        upload_usage = (
-            usage.get("upload", 0) + db_ports[port_num].usage.upload_accumulate
-        )
-        port_usage.upload = upload_usage
-        if accumulate:
-            port_usage.upload_accumulate = upload_usage
-    edit_port_usage(db, db_ports[port_num].id, port_usage)
-    db.refresh(db_ports[port_num])
+        ):
+            port_usages.append(port_usage)
+    now = int(time.time())
+    increase_port_usages(
+        db,
+        port_usages,
+        sample_ts=datetime.utcfromtimestamp(
+            now - now % USAGE_SAMPLE_SECONDS
+        ),
+    )
+    set_traffic_counters(
+        server.id,
+        {
+            port_num: counter
+            for port_num, counter in counters.items()
+            if port_num in traffics
+        },
+    )
 
 
-def apply_port_limits(db: Session, port: Port, action: LimitActionEnum):
+def apply_port_limits(
+    db: Session, actions: t.List[t.Tuple[Port, LimitActionEnum]]
+) -> None:
     action_to_speed = {
         LimitActionEnum.SPEED_LIMIT_10K: 10,
         LimitActionEnum.SPEED_LIMIT_100K: 100,
@@ -86,40 +152,57 @@ def apply_port_limits(db: Session, port: Port, action: LimitActionEnum):
         LimitActionEnum.SPEED_LIMIT_100M: 100000,
         LimitActionEnum.SPEED_LIMIT_1G: 1000000,
     }
-    db.refresh(port)
-    if action == LimitActionEnum.NO_ACTION:
+    cleaned_ports = {}
+    limited_ports = {}
+    for port, action in actions:
+        if action == LimitActionEnum.DELETE_RULE:
+            if not port.forward_rule or port.id in cleaned_ports:
+                continue
+            db.delete(port.forward_rule)
+            cleaned_ports[port.id] = port
+        elif action in action_to_speed:
+            if (
+                port.config.get("egress_limit") != action_to_speed[action]
+                or port.config.get("ingress_limit") != action_to_speed[action]
+            ):
+                port.config["egress_limit"] = action_to_speed[action]
+                port.config["ingress_limit"] = action_to_speed[action]
+                db.add(port)
+                limited_ports[port.id] = port
+        else:
+            print(f"No action found {action} for port (id: {port.id})")
+    if not cleaned_ports and not limited_ports:
         return
-    elif action == LimitActionEnum.DELETE_RULE:
-        if not port.forward_rule:
-            return
-        delete_forward_rule(db, port.server_id, port.id)
-        clean_port_no_update_runner(server_id=port.server.id, port_num=port.num)
-    elif action in action_to_speed:
-        if (
-            port.config["egress_limit"] != action_to_speed[action]
-            or port.config["ingress_limit"] != action_to_speed[action]
-        ):
-            port.config["egress_limit"] = action_to_speed[action]
-            port.config["ingress_limit"] = action_to_speed[action]
-            db.add(port)
-            db.commit()
-            tc_runner(
-                kwargs={
-                    "server_id": port.server.id,
-                    "port_num": port.num,
-                    "egress_limit": port.config.get("egress_limit"),
-                    "ingress_limit": port.config.get("ingress_limit"),
-                },
-                priority=0,
-            )
-    else:
-        print(f"No action found {action} for port (id: {port.id})")
+    db.commit()
 
+    for port in cleaned_ports.values():
+        enqueue_server_task(
+            port.server_id,
+            "clean_port",
+            port_id=None,
+            port_num=port.num,
+            update_traffic=False,
+        )
+    tc_ops = defaultdict(list)
+    for port in limited_ports.values():
+        tc_ops[port.server_id].append(
+            {
+                "port_num": port.num,
+                "egress_limit": port.config.get("egress_limit"),
+                "ingress_limit": port.config.get("ingress_limit"),
+            }
+        )
+    # One tc run re-syncs every limited port of a server
+    for server_id, ops in tc_ops.items():
+        enqueue_server_tasks(server_id, "tc", ops)
 
-def check_limits(config: t.Dict, usage: int) -> LimitActionEnum:
-    if config.get(
-        "valid_until"
-    ) and datetime.utcnow() >= datetime.utcfromtimestamp(
+
+def check_limits(
+    config: t.Dict, usage: int, now: datetime = None
+) -> LimitActionEnum:
+    if now is None:
+        now = datetime.utcnow()
+    if config.get("valid_until") and now >= datetime.utcfromtimestamp(
         config.get("valid_until") / 1000
     ):
         return LimitActionEnum(config.get("due_action", 0))
@@ -128,66 +211,56 @@ def check_limits(config: t.Dict, usage: int) -> LimitActionEnum:
     return None
 
 
-def check_port_limits(db: Session, port: Port) -> None:
-    action = check_limits(port.config, port.usage.download + port.usage.upload)
-    if action is not None:
-        apply_port_limits(db, port, action)
-
-
-def check_server_user_limit(
-    db: Session, server: Server, server_users_usage: t.DefaultDict
-):
-    for server_user in server.allowed_users:
-        server_user.download = server_users_usage[server_user.user_id][
-            "download"
-        ]
-        server_user.upload = server_users_usage[server_user.user_id]["upload"]
-        db.add(server_user)
-        db.commit()
-        db.refresh(server_user)
+def check_server_limits(
+    db: Session, server: Server
+) -> t.List[t.Tuple[Port, LimitActionEnum]]:
+    """
+    Evaluate port and server user limits of a server in one pass,
+    returns the (port, action) pairs that need to be applied.
+    """
+    now = datetime.utcnow()
+    actions = []
+    for port in server.ports:
+        if not port.usage:
+            continue
         action = check_limits(
-            server_user.config, server_user.download + server_user.upload
+            port.config, port.usage.download + port.usage.upload, now
         )
-        if action is not None:
+        if action is not None and action != LimitActionEnum.NO_ACTION:
+            actions.append((port, action))
+
+    users_usage = get_server_users_usage(db, server.id)
+    users_action = {}
+    server_users_changed = []
+    for server_user in server.allowed_users:
+        download, upload = users_usage.get(server_user.user_id, (0, 0))
+        if server_user.download != download or server_user.upload != upload:
+            server_users_changed.append(
+                {"id": server_user.id, "download": download, "upload": upload}
+            )
+        action = check_limits(server_user.config, download + upload, now)
+        if action is not None and action != LimitActionEnum.NO_ACTION:
             print(f"ServerUser reached limit, apply action {action}")
-            for port in server_user.server.ports:
-                if server_user.user_id in [
-                    u.user_id for u in port.allowed_users
-                ]:
-                    apply_port_limits(db, port, action)
+            users_action[server_user.user_id] = action
+    if server_users_changed:
+        db.bulk_update_mappings(ServerUser, server_users_changed)
+        db.commit()
+
+    if users_action:
+        for port in server.ports:
+            for port_user in port.allowed_users:
+                if port_user.user_id in users_action:
+                    actions.append((port, users_action[port_user.user_id]))
+    return list(dict.fromkeys(actions))
 
 
 def update_traffic(
     server: Server, traffic: str, accumulate: bool = False
 ):
-    pattern = re.compile(r"\/\* (UPLOAD|DOWNLOAD)(?:\-UDP)? ([0-9]+)->")
-    prev_ports = {port.num: port for port in server.ports}
-    db_ports = {}
-    traffics = defaultdict(lambda: {"download": 0, "upload": 0})
-
-    for line in traffic.split("\n"):
-        match = pattern.search(line)
-        if match and len(match.groups()) > 1 and match.groups()[1].isdigit():
-            port_num = int(match.groups()[1])
-            traffics[port_num][match.groups()[0].lower()] += int(
-                line.split()[1]
-            )
+    traffics = aggregate_traffic(traffic)
     with db_session() as db:
-        for port_num, usage in traffics.items():
-            update_usage(
-                db, prev_ports, db_ports, server.id, port_num, usage, accumulate
-            )
-    server_users_usage = defaultdict(lambda: {"download": 0, "upload": 0})
+        update_usages(db, server, traffics, accumulate)
     with db_session() as db:
         server = get_server_with_ports_usage(db, server.id)
-        for port in server.ports:
-            if port.usage:
-                check_port_limits(db, port)
-                for port_user in port.allowed_users:
-                    server_users_usage[port_user.user_id][
-                        "download"
-                    ] += port.usage.download
-                    server_users_usage[port_user.user_id][
-                        "upload"
-                    ] += port.usage.upload
-        check_server_user_limit(db, server, server_users_usage)
+        actions = check_server_limits(db, server)
+        apply_port_limits(db, actions)
@@ -0,0 +1,10 @@
+from .config import huey
+
+from .app import *
+from .artifacts import *
+from .clean import *
+from .iptables import *
+from .queue import *
+from .server import *
+from .tc import *
+from .traffic import *
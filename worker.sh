@@ -4,4 +4,4 @@ while nc -z postgres 5432 1> /dev/null 2>&1; do
   sleep 1;
 done;
 
-huey_consumer.py tasks.huey -w $(expr $(nproc) \* 2)
+huey_consumer.py tasks.worker.huey -f -w $(expr $(nproc) \* 2)